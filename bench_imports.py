@@ -0,0 +1,88 @@
+"""
+import-time benchmark: imports each module in a fresh interpreter and reports cold start in milliseconds, along
+with any heavy dependencies the import pulled in
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ('nlp_pool', 'document', 'evaluation', 'boundaries', 'scoring', 'corpus_index', 'parse_cache',
+           'tile_reader', 'lexical_chains', 'tile_vintro', 'word_vecs', 'vectors', 'streaming', 'significance',
+           'sweep', 'centering/cb_finder', 'centering/bridging', 'centering/transition_framework',
+           'discourseParsing/relation_labeler', 'discourseParsing/relation_tagger',
+           'discourseParsing/rst_segmenter')
+
+HEAVY = ('spacy', 'sklearn', 'scipy', 'xrenner', 'depedit')
+
+_CHILD = """
+import sys, time
+sys.path.insert(0, %r)
+sys.path.insert(0, %r)
+start = time.time()
+import %s
+elapsed = time.time() - start
+sys.stdout.write("%%f %%s" %% (elapsed, ",".join(name for name in %r if name in sys.modules)))
+"""
+
+
+def time_import(module, repeats=5):
+    """
+    Imports a module in repeats fresh interpreters
+    :param module: module name, optionally prefixed with its directory relative to the repository, e.g.
+        'centering/cb_finder'
+    :param repeats: int
+    :return: tuple(float, float, list)  # best import time and best total process time in milliseconds, and the
+        heavy dependencies loaded by the import
+    """
+    directory, name = os.path.split(module)
+    code = _CHILD % (ROOT, os.path.join(ROOT, directory), name, HEAVY)
+    best_import = best_total = float('inf')
+    loaded = []
+    for repeat in range(repeats):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        total = time.time() - start
+        if process.returncode != 0:
+            raise RuntimeError("Importing %s failed:\n%s" % (module, err.decode('utf8', 'replace')))
+        elapsed, names = out.decode('utf8').split(" ", 1)
+        best_import = min(best_import, float(elapsed) * 1000)
+        best_total = min(best_total, total * 1000)
+        loaded = [name for name in names.split(",") if name]
+    return best_import, best_total, loaded
+
+
+def interpreter_startup(repeats=5):
+    """
+    :return: float, best time in milliseconds to start and exit an empty interpreter
+    """
+    best = float('inf')
+    for repeat in range(repeats):
+        start = time.time()
+        subprocess.call([sys.executable, "-c", "pass"])
+        best = min(best, (time.time() - start) * 1000)
+    return best
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Cold import time of each module in a fresh interpreter")
+    parser.add_argument("modules", nargs="*", help="Modules to time (default: all tiling and parsing modules)")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="Runs per module; the best is reported")
+
+    options = parser.parse_args()
+    print("interpreter startup: %.1f ms" % interpreter_startup(options.repeats))
+    print("\t".join(["module", "import ms", "process ms", "heavy dependencies"]))
+    for module in options.modules or MODULES:
+        try:
+            import_ms, total_ms, loaded = time_import(module, options.repeats)
+        except RuntimeError as error:
+            print("%s\tfailed: %s" % (module, str(error).strip().split("\n")[-1]))
+            continue
+        print("%s\t%.1f\t%.1f\t%s" % (module, import_ms, total_ms, ", ".join(loaded) or "-"))
@@ -0,0 +1,128 @@
+"""
+sparse boundary-position format for segmentations, with readers and writers for the dense formats in data/
+"""
+
+from collections import namedtuple, OrderedDict
+import os
+import numpy
+
+# document order of the lines in the GUM_5_*.txt files
+GUM_5_DOCS = ('athens', 'chatham', 'coron', 'cuba', 'merida')
+
+# positions: sorted array of the sentence indices that begin a tile (the 1's of a dense vector); length: sentences
+Segmentation = namedtuple('Segmentation', ['positions', 'length'])
+
+
+def from_tiles(tiles):
+    """
+    :param tiles: dense binary tile vector [1,0,0,1, ...]
+    :return: Segmentation
+    """
+    return Segmentation(numpy.flatnonzero(tiles).astype(numpy.int64), len(tiles))
+
+
+def to_tiles(segmentation):
+    """
+    :param segmentation: Segmentation
+    :return: dense binary tile vector as a list
+    """
+    tiles = [0] * segmentation.length
+    for position in segmentation.positions:
+        tiles[position] = 1
+    return tiles
+
+
+def read_comma(filename, names=None):
+    """
+    Reads comma separated dense vectors, one document per line, as in data/GUM_5_gold_tiles.txt
+
+    :param filename: file name
+    :param names: optional document names for the lines, e.g. GUM_5_DOCS; defaults to line numbers
+    :return: OrderedDict from document name to Segmentation
+    """
+    segmentations = OrderedDict()
+    with open(filename) as infile:
+        lines = [line.replace("\r", "").replace(" ", "").strip() for line in infile]
+    lines = [line for line in lines if line]
+    if names is None:
+        names = [str(index) for index in range(len(lines))]
+    for name, line in zip(names, lines):
+        segmentations[name] = from_tiles([int(bit) for bit in line.split(",") if bit])
+    return segmentations
+
+
+def read_named(filename):
+    """
+    Reads whitespace separated dense vectors preceded by the document name, as in data/boundaries
+
+    :return: OrderedDict from document name to Segmentation
+    """
+    segmentations = OrderedDict()
+    with open(filename) as infile:
+        for line in infile:
+            line = line.split()
+            if line:
+                segmentations[line[0]] = from_tiles([int(bit) for bit in line[1:]])
+    return segmentations
+
+
+def read_positions(filename):
+    """
+    Reads the sparse format: one document per line as name, length and space separated boundary positions,
+    separated by tabs
+
+    :return: OrderedDict from document name to Segmentation
+    """
+    segmentations = OrderedDict()
+    with open(filename) as infile:
+        for line in infile:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 2:
+                continue
+            positions = numpy.array([int(position) for position in fields[2].split()] if len(fields) > 2 else [],
+                                    dtype=numpy.int64)
+            segmentations[fields[0]] = Segmentation(positions, int(fields[1]))
+    return segmentations
+
+
+def read(filename, names=None):
+    """
+    Reads any of the three formats, telling them apart by the first non-empty line
+
+    :return: OrderedDict from document name to Segmentation
+    """
+    with open(filename) as infile:
+        first = next((line for line in infile if line.strip()), "")
+    fields = first.rstrip("\r\n").split("\t")
+    if len(fields) in (2, 3) and fields[1].isdigit():
+        return read_positions(filename)
+    if "," in first:
+        return read_comma(filename, names)
+    return read_named(filename)
+
+
+def system_name(filename):
+    """
+    :return: str, the name of the system that produced a prediction file: the file name without directory,
+        extension and GUM_5_prediction_ prefix
+    """
+    return os.path.splitext(os.path.basename(filename))[0].replace("GUM_5_prediction_", "")
+
+
+def write_comma(filename, segmentations):
+    with open(filename, "w") as outfile:
+        outfile.write("\n".join(",".join(str(bit) for bit in to_tiles(segmentation))
+                                for segmentation in segmentations.values()))
+
+
+def write_named(filename, segmentations):
+    with open(filename, "w") as outfile:
+        for name, segmentation in segmentations.items():
+            outfile.write(name + "  " + " ".join(str(bit) for bit in to_tiles(segmentation)) + "\n")
+
+
+def write_positions(filename, segmentations):
+    with open(filename, "w") as outfile:
+        for name, segmentation in segmentations.items():
+            outfile.write("\t".join((name, str(segmentation.length),
+                                     " ".join(str(position) for position in segmentation.positions))) + "\n")
@@ -1,6 +1,4 @@
 import numpy
-from xrenner import Xrenner
-from vectors import Vectors
 
 def bridging(xrenner, vectors, type='conservative'):
     """
@@ -43,6 +41,8 @@ def bridging(xrenner, vectors, type='conservative'):
     return None
 
 if __name__ == "__main__":
+    from xrenner import Xrenner
+    from vectors import Vectors
 
     xrenner = Xrenner(override='GUM')
     xrenner.analyze('clinton_example.conll10', 'conll')
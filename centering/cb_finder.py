@@ -1,6 +1,3 @@
-from xrenner.modules.xrenner_xrenner import Xrenner
-from spacy.en import English
-from depedit.depedit import DepEdit
 import re
 
 
@@ -48,6 +45,10 @@ def cb_finder(xrenner):
 
 
 if __name__ == "__main__":
+    from xrenner.modules.xrenner_xrenner import Xrenner
+    from helper import get_nlp
+    from depedit.depedit import DepEdit
+
     # Part 1: Use spacy to get a dependency parse of the text
 
     text = u"""I have a different experience.
@@ -57,7 +58,7 @@ if __name__ == "__main__":
      dumped the paint in and took the squeegee and kept going."""
     # text = u"""John likes Mary.
     # John really likes her.""" # rule 1 test
-    parser = English(entity=False,load_vectors=False,vectors_package=False)
+    parser = get_nlp('en', entity=False, load_vectors=False, vectors_package=False)
     parsed = parser(text)
 
 
@@ -1,4 +1,4 @@
-import tempfile,os,subprocess
+import tempfile,os,subprocess,sys
 
 
 def exec_via_temp(input_text, command_params, workdir=""):
@@ -43,3 +43,13 @@ def make_cf_list(cf_table):
 		last_col = cols[0]
 	return out_sents
 
+def get_nlp(*args, **kwargs):
+	"""
+	Shared spaCy pipeline from the repository's nlp_pool, see nlp_pool.get_nlp. The repository root is put on
+	sys.path only when a pipeline is first requested, so importing the centering modules has no side effects.
+	"""
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	if root not in sys.path:
+		sys.path.append(root)
+	import nlp_pool
+	return nlp_pool.get_nlp(*args, **kwargs)
@@ -5,14 +5,12 @@ coherence evaluator
 import argparse
 import os
 import sys
-from depedit import DepEdit
-from xrenner import Xrenner
 
 # Centering module imports
 from cb_finder import cb_finder
 from vectors import Vectors
 from bridging import bridging
-from helper import exec_via_temp, make_cf_input, make_cf_list
+from helper import exec_via_temp, get_nlp, make_cf_input, make_cf_list
 # ToDo: Need cf module
 
 
@@ -48,6 +46,9 @@ def main(text):
 # Funcs
 # ======================================================================================================================
 def parse(text_file):
+    from depedit import DepEdit
+    from xrenner import Xrenner
+
     with open(text_file, "rb") as f:
         text = unicode(f.read())
 
@@ -56,8 +57,7 @@ def parse(text_file):
 
     elif text_file.endswith(".txt"):
         # Get parse from Spacy
-        from spacy.en import English
-        parser = English(entity=False, load_vectors=False, vectors_package=False)
+        parser = get_nlp('en', entity=False, load_vectors=False, vectors_package=False)
         parsed = parser(text)
 
         # Transform to conll format
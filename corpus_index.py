@@ -0,0 +1,169 @@
+"""
+incremental corpus-level term statistics for TF-IDF weighted tiling
+"""
+
+import numpy
+
+
+def _grow(array, size):
+    """
+    Returns array with room for at least size entries, doubling its capacity when full
+    """
+    if size <= len(array):
+        return array
+    grown = numpy.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class CorpusIndex(object):
+    """
+    Document frequency, collection frequency and per-document term counts over many documents, kept in compact
+    arrays. Term counts are stored CSR-style: document i has the terms doc_terms[doc_ptr[i]:doc_ptr[i+1]] with
+    counts doc_counts[doc_ptr[i]:doc_ptr[i+1]]. Adding a document updates the statistics in place.
+    """
+    def __init__(self):
+        self.term_index = {}
+        self.terms = []
+        self.doc_names = []
+        self.doc_index = {}
+        self._df = numpy.zeros(1024, dtype=numpy.int64)
+        self._cf = numpy.zeros(1024, dtype=numpy.int64)
+        self._doc_ptr = numpy.zeros(64, dtype=numpy.int64)
+        self._doc_terms = numpy.zeros(4096, dtype=numpy.int32)
+        self._doc_counts = numpy.zeros(4096, dtype=numpy.int32)
+
+    @property
+    def n_docs(self):
+        return len(self.doc_names)
+
+    @property
+    def n_terms(self):
+        return len(self.terms)
+
+    @property
+    def df(self):
+        return self._df[:self.n_terms]
+
+    @property
+    def cf(self):
+        return self._cf[:self.n_terms]
+
+    @property
+    def doc_ptr(self):
+        return self._doc_ptr[:self.n_docs + 1]
+
+    @property
+    def doc_terms(self):
+        return self._doc_terms[:self._doc_ptr[self.n_docs]]
+
+    @property
+    def doc_counts(self):
+        return self._doc_counts[:self._doc_ptr[self.n_docs]]
+
+    def add(self, name, freqs):
+        """
+        Adds one document to the index
+
+        :param name: unique document name
+        :param freqs: dictionary from lemmas to counts in the document, e.g. TileReader.get_freqs()
+        :return: void
+        """
+        if name in self.doc_index:
+            raise ValueError("Document '" + str(name) + "' is already in the index")
+        term_ids = numpy.zeros(len(freqs), dtype=numpy.int32)
+        counts = numpy.zeros(len(freqs), dtype=numpy.int32)
+        for position, (term, count) in enumerate(freqs.items()):
+            if term not in self.term_index:
+                self.term_index[term] = len(self.terms)
+                self.terms.append(term)
+            term_ids[position] = self.term_index[term]
+            counts[position] = count
+        order = numpy.argsort(term_ids)
+        term_ids, counts = term_ids[order], counts[order]
+
+        self._df = _grow(self._df, self.n_terms)
+        self._cf = _grow(self._cf, self.n_terms)
+        self._df[term_ids] += 1
+        self._cf[term_ids] += counts
+
+        start = self._doc_ptr[self.n_docs]
+        end = start + len(term_ids)
+        self._doc_terms = _grow(self._doc_terms, end)
+        self._doc_counts = _grow(self._doc_counts, end)
+        self._doc_terms[start:end] = term_ids
+        self._doc_counts[start:end] = counts
+        self._doc_ptr = _grow(self._doc_ptr, self.n_docs + 2)
+        self._doc_ptr[self.n_docs + 1] = end
+
+        self.doc_index[name] = self.n_docs
+        self.doc_names.append(name)
+
+    def add_reader(self, name, reader):
+        """
+        Adds the lemma frequencies of a TileReader after read
+        """
+        self.add(name, reader.get_freqs())
+
+    def add_document(self, name, document):
+        """
+        Adds the lemma frequencies of a document.Document
+        """
+        counts = numpy.bincount(document.lemma_ids, minlength=len(document.lemmas))
+        self.add(name, dict((lemma, int(count)) for lemma, count in zip(document.lemmas, counts) if count))
+
+    def get_freqs(self, name):
+        """
+        :param name: document name
+        :return: dictionary from lemmas to counts in that document
+        """
+        doc = self.doc_index[name]
+        start, end = self._doc_ptr[doc], self._doc_ptr[doc + 1]
+        return dict((self.terms[term], int(count))
+                    for term, count in zip(self._doc_terms[start:end], self._doc_counts[start:end]))
+
+    def idf(self, lemmas=None, smooth=True):
+        """
+        Inverse document frequencies. Smoothed IDF is log((1 + N) / (1 + df)) + 1, which keeps unseen terms finite;
+        else log(N / df).
+
+        :param lemmas: optional list of lemmas; terms not in the index get df 0
+        :return: array of IDF weights for lemmas, or for all terms in index order
+        """
+        if lemmas is None:
+            df = self.df.astype(numpy.float64)
+        else:
+            df = numpy.array([self._df[self.term_index[lemma]] if lemma in self.term_index else 0 for lemma in lemmas],
+                             dtype=numpy.float64)
+        if smooth:
+            return numpy.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0
+        with numpy.errstate(divide='ignore'):
+            return numpy.log(self.n_docs / df)
+
+    def save(self, filename):
+        """
+        Saves the index to a compressed .npz file
+        """
+        numpy.savez_compressed(filename, terms=numpy.array(self.terms, dtype=numpy.unicode_),
+                               doc_names=numpy.array(self.doc_names, dtype=numpy.unicode_), df=self.df, cf=self.cf,
+                               doc_ptr=self.doc_ptr, doc_terms=self.doc_terms, doc_counts=self.doc_counts)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads an index saved with save; documents can be added to it as before
+        """
+        if not filename.endswith('.npz'):
+            filename += '.npz'
+        data = numpy.load(filename)
+        index = cls()
+        index.terms = list(data['terms'])
+        index.term_index = dict((term, i) for i, term in enumerate(index.terms))
+        index.doc_names = list(data['doc_names'])
+        index.doc_index = dict((name, i) for i, name in enumerate(index.doc_names))
+        index._df = data['df'].astype(numpy.int64)
+        index._cf = data['cf'].astype(numpy.int64)
+        index._doc_ptr = data['doc_ptr'].astype(numpy.int64)
+        index._doc_terms = data['doc_terms'].astype(numpy.int32)
+        index._doc_counts = data['doc_counts'].astype(numpy.int32)
+        return index
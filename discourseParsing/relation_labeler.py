@@ -1,8 +1,5 @@
 import numpy
 import pickle
-from sklearn.neighbors import BallTree
-from scipy.spatial.distance import cosine
-from sklearn.svm import LinearSVC
 
 
 class Vectors:
@@ -27,6 +24,8 @@ class Vectors:
             self.optimize()
 
     def optimize(self):
+        from sklearn.neighbors import BallTree
+        from scipy.spatial.distance import cosine
         if not self.ball_tree:
             print('Optimizing search...')
             self.ball_tree = BallTree(self.vectors, metric=cosine)
@@ -67,6 +66,7 @@ class Vectors:
             a = self.ball_tree.query(numpy.array(vector).reshape(1, -1), k=k)
             dist, ind = a[0][0], a[1][0]
         else:
+            from scipy.spatial.distance import cosine
             dists = [cosine(vector, vec) for vec in self.vectors]
             ind = numpy.argsort(dists)[:k]
             dist = [dists[i] for i in ind]
@@ -77,6 +77,7 @@ class Vectors:
             return tuple(self.words[ind[i]] for i in range(len(ind)))
 
     def distance(self, item1, item2, errors=True):
+        from scipy.spatial.distance import cosine
         if isinstance(item1, str):
             item1 = self.get(item1, errors=errors)
         if isinstance(item2, str):
@@ -111,6 +112,7 @@ class RelationLabeler:
                           'ROOT']
 
         self.vectors = Vectors(vector_file, False)
+        from sklearn.svm import LinearSVC
         self.classifier = LinearSVC()
 
     def train(self, filename):
@@ -280,6 +282,7 @@ class RelationLabeler:
                     data[int(line[0])] = value
 
 
-rl = RelationLabeler('../vectors/GoogleNewsVecs.txt')
-rl.train('rst_train.rsd')
-rl.test('rst_test.rsd')
+if __name__ == "__main__":
+    rl = RelationLabeler('../vectors/GoogleNewsVecs.txt')
+    rl.train('rst_train.rsd')
+    rl.test('rst_test.rsd')
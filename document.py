@@ -0,0 +1,252 @@
+"""
+compact integer-encoded document representation shared by the tilers
+"""
+
+import numpy
+
+# tag sets for which boolean token masks are precomputed: tile_vintro and word_vecs vocabulary tags, and the
+# LexicalChains stop POS filter
+COMMON_TAG_SETS = (("NOUN", "PROPN", "VERB", "ADJ"),
+                   ("NOUN", "PROPN"),
+                   ('PUNCT', 'SYM', 'SPACE', 'DET'))
+
+
+def check_window(k, n_sentences):
+    """
+    :param k: Half the window size, i.e. the number of sentences on either side of the split
+    :param n_sentences: number of sentences in the text
+    :raise IndexError: if a window of 2*k sentences does not fit in the text
+    """
+    if 2*k > n_sentences:
+        raise IndexError("Window k="+str(k)+" too large for text.\n" +
+                         "Expected > 2*" + str(k) +" sentences but only " + str(n_sentences) + " found in text")
+
+
+def block_windows(prefix, k):
+    """
+    :param prefix: prefix sum array over sentences, with a leading zero row
+    :param k: Half the window size, i.e. the number of sentences on either side of the split
+    :return: 2-place tuple of arrays with the sums of the k sentences left and right of every gap
+    """
+    n_sentences = len(prefix) - 1
+    check_window(k, n_sentences)
+    gaps = n_sentences - 2*k + 1
+    middle = prefix[k:k+gaps]
+    return middle - prefix[:gaps], prefix[2*k:2*k+gaps] - middle
+
+
+class Document(object):
+    """
+    A parsed document as flat NumPy arrays. Tokens are stored as indices into lemma, POS tag and word form tables,
+    and sentences as CSR-style offsets: sentence i spans tokens sent_offsets[i]:sent_offsets[i+1]. Optionally holds
+    one vector per word form and the text of each sentence, and the identity of the model that produced them. Built
+    once from spaCy output by TileReader, after which the spaCy objects can be dropped.
+    """
+    def __init__(self, lemma_ids, pos_ids, word_ids, sent_offsets, lemmas, tags, words, vectors=None, texts=None,
+                 model_id=None):
+        self.lemma_ids = numpy.asarray(lemma_ids, dtype=numpy.int32)
+        self.pos_ids = numpy.asarray(pos_ids, dtype=numpy.int16)
+        self.word_ids = numpy.asarray(word_ids, dtype=numpy.int32)
+        self.sent_offsets = numpy.asarray(sent_offsets, dtype=numpy.int64)
+        self.lemmas = numpy.asarray(lemmas, dtype=numpy.unicode_)
+        self.tags = numpy.asarray(tags, dtype=numpy.unicode_)
+        self.words = numpy.asarray(words, dtype=numpy.unicode_)
+        self.vectors = None if vectors is None else numpy.asarray(vectors, dtype=numpy.float32)
+        self.texts = None if texts is None else numpy.asarray(texts, dtype=numpy.unicode_)
+        self.model_id = None if model_id is None else unicode(model_id)
+        self._masks = {}
+        for tag_set in COMMON_TAG_SETS:
+            self.mask(tag_set)
+
+    @classmethod
+    def from_sentences(cls, sentences, with_vectors=True, with_texts=True, model_id=None):
+        """
+        Builds a Document from spaCy sentences
+
+        :param sentences: list of sentence spans or lists of spaCy tokens, e.g. TileReader.sentences
+        :param with_vectors: boolean, whether to store the vector of each word form
+        :param with_texts: boolean, whether to store the text of each sentence
+        :param model_id: optional string identifying the spaCy model that parsed the sentences
+        :return: Document
+        """
+        tables = ({}, {}, {})
+        ids = ([], [], [])
+        sent_offsets = [0]
+        vectors = []
+        texts = []
+        for sent in sentences:
+            for tok in sent:
+                for table, token_ids, value in zip(tables, ids, (tok.lemma_, tok.pos_, tok.orth_)):
+                    if value not in table:
+                        table[value] = len(table)
+                        if table is tables[2] and with_vectors:
+                            vectors.append(tok.vector)
+                    token_ids.append(table[value])
+            sent_offsets.append(len(ids[0]))
+            if with_texts:
+                texts.append(sent.text if hasattr(sent, "text") else u" ".join(tok.orth_ for tok in sent))
+        lemmas, tags, words = [sorted(table, key=table.get) for table in tables]
+        if with_vectors:
+            vectors = numpy.array(vectors, dtype=numpy.float32) if vectors else numpy.zeros((0, 0), numpy.float32)
+        return cls(ids[0], ids[1], ids[2], sent_offsets, lemmas, tags, words,
+                   vectors if with_vectors else None, texts if with_texts else None, model_id)
+
+    def __len__(self):
+        return len(self.lemma_ids)
+
+    @property
+    def n_sentences(self):
+        return len(self.sent_offsets) - 1
+
+    def sentence_lengths(self):
+        """
+        :return: array of token counts per sentence
+        """
+        return numpy.diff(self.sent_offsets)
+
+    def sentence_ids(self):
+        """
+        :return: array with the index of the sentence each token belongs to
+        """
+        return numpy.repeat(numpy.arange(self.n_sentences), self.sentence_lengths())
+
+    def count_matrix(self, ids, n_columns, mask=None):
+        """
+        Sparse sentence by type count matrix for per-token type IDs such as lemma_ids or word_ids
+
+        :param ids: per-token array of type IDs
+        :param n_columns: number of types
+        :param mask: optional boolean token mask; only tokens where it is True are counted
+        :return: scipy.sparse.csr_matrix of shape (sentences, n_columns)
+        """
+        from scipy import sparse
+        rows = self.sentence_ids()
+        if mask is not None:
+            rows, ids = rows[mask], ids[mask]
+        counts = numpy.ones(len(ids), dtype=numpy.int32)
+        return sparse.csr_matrix((counts, (rows, ids)), shape=(self.n_sentences, n_columns))
+
+    def block_stats(self, vocab_tags=(), word_vectors=None):
+        """
+        :param vocab_tags: POS tags of tokens counted as vocabulary terms for new term counts
+        :param word_vectors: optional matrix with one row per entry of words, defaults to the document's vectors
+        :return: BlockStats for this document
+        """
+        return BlockStats(self, vocab_tags, word_vectors)
+
+    def mask(self, tags):
+        """
+        Boolean mask over tokens whose POS tag is in tags. Masks are cached per tag set.
+
+        :param tags: iterable of POS tag strings
+        :return: boolean array of document length
+        """
+        key = tuple(sorted(set(tags)))
+        if key not in self._masks:
+            tag_ids = [index for index, tag in enumerate(self.tags) if tag in key]
+            self._masks[key] = numpy.in1d(self.pos_ids, tag_ids)
+        return self._masks[key]
+
+    def split(self, values):
+        """
+        Splits a per-token array into a list of per-sentence arrays
+        """
+        return numpy.split(values, self.sent_offsets[1:-1])
+
+    def lemma_lists(self, mask=None):
+        """
+        :param mask: optional boolean token mask; only tokens where it is True are kept
+        :return: list of lemma ID arrays, one per sentence
+        """
+        if mask is None:
+            return self.split(self.lemma_ids)
+        return [ids[keep] for ids, keep in zip(self.split(self.lemma_ids), self.split(mask))]
+
+    def save(self, filename):
+        """
+        Saves the document arrays to a compressed .npz file
+        """
+        arrays = {'lemma_ids': self.lemma_ids, 'pos_ids': self.pos_ids, 'word_ids': self.word_ids,
+                  'sent_offsets': self.sent_offsets, 'lemmas': self.lemmas, 'tags': self.tags, 'words': self.words}
+        if self.vectors is not None:
+            arrays['vectors'] = self.vectors
+        if self.texts is not None:
+            arrays['texts'] = self.texts
+        if self.model_id is not None:
+            arrays['model_id'] = numpy.array(self.model_id)
+        numpy.savez_compressed(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a document saved with save
+        """
+        if not filename.endswith('.npz'):
+            filename += '.npz'
+        data = numpy.load(filename)
+        return cls(**dict((name, data[name]) for name in data.files))
+
+
+class BlockStats(object):
+    """
+    Left and right block aggregates for every gap of a document, as returned by TileReader.get_blocks: for gap i
+    the left block holds sentences i..i+k-1 and the right block sentences i+k..i+2k-1. Per-sentence statistics are
+    accumulated once into prefix sums, after which the aggregates for all gaps and any k are array differences.
+    """
+    def __init__(self, document, vocab_tags=(), word_vectors=None):
+        self.document = document
+        self.n_sentences = document.n_sentences
+        self.token_prefix = self._prefix(document.sentence_lengths())
+
+        # a term is new in the sentence holding its first vocabulary occurrence
+        mask = document.mask(vocab_tags)
+        first = numpy.unique(document.lemma_ids[mask], return_index=True)[1]
+        first_sents = document.sentence_ids()[mask][first]
+        self.new_term_prefix = self._prefix(numpy.bincount(first_sents, minlength=self.n_sentences))
+
+        self.word_vectors = document.vectors if word_vectors is None else numpy.asarray(word_vectors)
+        self._embedding_prefix = None
+        self._lemma_matrix = None
+
+    @staticmethod
+    def _prefix(values):
+        return numpy.concatenate((numpy.zeros((1,) + values.shape[1:], dtype=values.dtype), numpy.cumsum(values, axis=0)))
+
+    def windows(self, prefix, k):
+        """
+        :param prefix: prefix sum array over sentences, with a leading zero row
+        :param k: Half the window size, i.e. the number of sentences on either side of the split
+        :return: 2-place tuple of arrays with the left and right block sums for every gap
+        """
+        return block_windows(prefix, k)
+
+    def token_counts(self, k):
+        return self.windows(self.token_prefix, k)
+
+    def new_term_counts(self, k):
+        return self.windows(self.new_term_prefix, k)
+
+    def embedding_sums(self, k):
+        """
+        :return: 2-place tuple of (gaps, dimensions) arrays with the summed token vectors of each block
+        """
+        if self._embedding_prefix is None:
+            counts = self.document.count_matrix(self.document.word_ids, len(self.word_vectors))
+            self._embedding_prefix = self._prefix(counts.dot(self.word_vectors))
+        return self.windows(self._embedding_prefix, k)
+
+    def lemma_counts(self, k):
+        """
+        Lemma count vectors of each block. These are sparse, and since their total size grows with k they are
+        computed with a banded sparse product rather than dense prefix sums.
+
+        :return: 2-place tuple of scipy.sparse.csr_matrix of shape (gaps, lemmas)
+        """
+        from scipy import sparse
+        check_window(k, self.n_sentences)
+        if self._lemma_matrix is None:
+            self._lemma_matrix = self.document.count_matrix(self.document.lemma_ids, len(self.document.lemmas))
+        gaps = self.n_sentences - 2*k + 1
+        left = sparse.diags([numpy.ones(gaps)] * k, range(k), shape=(gaps, self.n_sentences), format='csr')
+        right = sparse.diags([numpy.ones(gaps)] * k, range(k, 2*k), shape=(gaps, self.n_sentences), format='csr')
+        return left.dot(self._lemma_matrix), right.dot(self._lemma_matrix)
@@ -0,0 +1,202 @@
+"""
+cross-document cache of sentence embeddings for the vector tiler
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import numpy
+
+_SPACES = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize(text):
+    """
+    :param text: sentence text
+    :return: unicode text with whitespace runs collapsed to single spaces and stripped at both ends
+    """
+    if not isinstance(text, unicode):
+        text = text.decode("utf8")
+    return _SPACES.sub(u" ", text).strip()
+
+
+def vector_store_id(vectors, model_id=None):
+    """
+    String identifying a vector store, so that embeddings from different stores never share keys. A store may set
+    its own identity attribute; otherwise it is fingerprinted by its size, its first words and vectors.
+
+    :param vectors: Vectors object, or None for the word vectors of the spaCy model that built the documents
+    :param model_id: with vectors=None, the identity of that model, e.g. Document.model_id
+    :return: string
+    """
+    if vectors is None:
+        if model_id is None:
+            raise ValueError("Unknown spaCy model for document vectors; build the document with "
+                             "TileReader.build_document or pass a Vectors object")
+        return "document-vectors/" + model_id
+    identity = getattr(vectors, "identity", None)
+    if identity:
+        return identity
+    digest = hashlib.sha1()
+    digest.update(str(len(vectors.words)).encode("utf8"))
+    for word in vectors.words[:100]:
+        digest.update(b"\0" + (word if isinstance(word, bytes) else word.encode("utf8")))
+    if len(vectors.vectors):
+        digest.update(numpy.asarray(vectors.vectors[0], dtype=numpy.float32).tostring())
+        digest.update(numpy.asarray(vectors.vectors[len(vectors.vectors) - 1], dtype=numpy.float32).tostring())
+    return "vectors-" + digest.hexdigest()
+
+
+class EmbeddingCache(object):
+    """
+    Sentence embeddings keyed by a hash of the vector store identity and the normalized sentence text. Embeddings
+    are held in an in-memory LRU capped at max_bytes and, with a directory, in an append-only float32 file that is
+    read through a memory map, with its index of keys, offsets and lengths appended alongside. New embeddings are
+    buffered and appended to disk by flush. Disk hits are promoted to memory. The disk tier is never evicted;
+    remove the directory to reset it. Not safe for concurrent writers.
+    """
+    def __init__(self, max_bytes=64 * 1024 ** 2, directory=None):
+        """
+        :param max_bytes: size cap of the in-memory tier in bytes
+        :param directory: optional directory of the on-disk tier, created if missing
+        """
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.directory = directory
+        self.disk_index = {}
+        self.disk_size = 0
+        # embeddings put since the last flush, in order
+        self.pending = OrderedDict()
+        self._map = None
+        if directory is not None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.data_file = os.path.join(directory, "embeddings.f32")
+            self.index_file = os.path.join(directory, "index.tsv")
+            self._load_index()
+
+    @staticmethod
+    def make_key(text, store_id):
+        """
+        :param text: sentence text
+        :param store_id: vector store identity, e.g. from vector_store_id
+        :return: hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(store_id.encode("utf8"))
+        digest.update(b"\0")
+        digest.update(normalize(text).encode("utf8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        :param key: key from make_key
+        :return: float32 embedding, or None if the key is not cached
+        """
+        vector = self.memory.get(key)
+        if vector is not None:
+            del self.memory[key]
+            self.memory[key] = vector
+            self.hits += 1
+            return vector
+        vector = self.pending.get(key)
+        if vector is not None:
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+        entry = self.disk_index.get(key)
+        if entry is not None:
+            vector = numpy.array(self._disk_rows(*entry))
+            self._remember(key, vector)
+            self.hits += 1
+            self.disk_hits += 1
+            return vector
+        self.misses += 1
+        return None
+
+    def put(self, key, vector):
+        """
+        Stores an embedding in memory, evicting least recently used ones over the size cap, and, if the cache has
+        a directory and the key is not on disk yet, queues it for the next flush
+
+        :param key: key from make_key
+        :param vector: 1-D array
+        :return: void
+        """
+        vector = numpy.asarray(vector, dtype=numpy.float32)
+        self._remember(key, vector)
+        if self.directory is not None and key not in self.disk_index:
+            self.pending[key] = vector
+
+    def flush(self):
+        """
+        Appends the embeddings queued by put to the disk tier, with one write to the data file and one to the index
+        """
+        if not self.pending:
+            return
+        offset = self.disk_size
+        lines = []
+        for key, vector in self.pending.items():
+            lines.append("%s\t%d\t%d\n" % (key, offset, len(vector)))
+            self.disk_index[key] = (offset, len(vector))
+            offset += len(vector)
+        with open(self.data_file, "ab") as outfile:
+            outfile.write(numpy.concatenate(list(self.pending.values())).tostring())
+        with open(self.index_file, "a") as outfile:
+            outfile.write("".join(lines))
+        self.disk_size = offset
+        self.pending.clear()
+
+    def stats(self):
+        """
+        :return: dictionary with hit, disk hit and miss counts, the hit rate and the sizes of both tiers
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": self.hits / float(lookups) if lookups else 0.0,
+                "memory_entries": len(self.memory), "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk_index), "pending_entries": len(self.pending)}
+
+    def clear(self):
+        """
+        Empties the in-memory tier; the disk tier is kept, after flushing pending embeddings to it
+        """
+        self.flush()
+        self.memory.clear()
+        self.memory_bytes = 0
+
+    def _remember(self, key, vector):
+        if key in self.memory:
+            self.memory_bytes -= self.memory.pop(key).nbytes
+        if vector.nbytes > self.max_bytes:
+            return
+        self.memory[key] = vector
+        self.memory_bytes += vector.nbytes
+        while self.memory_bytes > self.max_bytes:
+            self.memory_bytes -= self.memory.popitem(last=False)[1].nbytes
+
+    def _load_index(self):
+        size = os.path.getsize(self.data_file) // 4 if os.path.exists(self.data_file) else 0
+        # new embeddings go after everything in the data file, including a partly written last vector
+        self.disk_size = size
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file) as infile:
+            for line in infile:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 3:
+                    continue
+                offset, length = int(fields[1]), int(fields[2])
+                # skip entries whose vector was not completely written
+                if offset + length <= size:
+                    self.disk_index[fields[0]] = (offset, length)
+
+    def _disk_rows(self, offset, length):
+        if self._map is None or offset + length > len(self._map):
+            self._map = numpy.memmap(self.data_file, dtype=numpy.float32, mode="r")
+        return self._map[offset:offset + length]
@@ -0,0 +1,207 @@
+"""
+single-pass segmentation evaluation: WindowDiff, Pk and boundary similarity for batches of documents
+"""
+
+import numpy
+
+METRICS = ('window_diff', 'pk', 'b')
+
+
+def _as_batch(tiles):
+    """
+    Returns a list of integer arrays from one binary tile vector or a list of them
+    """
+    if len(tiles) and numpy.ndim(tiles[0]) == 0:
+        tiles = [tiles]
+    return [numpy.asarray(doc, dtype=numpy.int64) for doc in tiles]
+
+
+def check_lengths(pred_lengths, gold_lengths, window_sizes):
+    """
+    Checks that a batch of segmentations can be scored
+    :param pred_lengths: list of predicted document lengths in tiles
+    :param gold_lengths: list of gold document lengths in tiles
+    :param window_sizes: list of window sizes, each of which must be smaller than every document
+    :raise IndexError: if the numbers of documents or any pair of lengths differ, or a window is too large
+    """
+    if len(pred_lengths) != len(gold_lengths):
+        raise IndexError("Expected the same number of gold and predicted documents. Found: " + str(len(gold_lengths)) +
+                         " gold but " + str(len(pred_lengths)) + " predicted documents\n")
+    for pred_length, gold_length in zip(pred_lengths, gold_lengths):
+        if pred_length != gold_length:
+            raise IndexError("Gold tiles and predicted tiles must have same length. Found: " + str(gold_length) +
+                             " gold tiles but " + str(pred_length) + " predicted tiles \n")
+        for window_size in window_sizes:
+            if window_size >= gold_length:
+                raise IndexError("Window size " + str(window_size) + " too large for text length " +
+                                 str(gold_length) + " tiles.\n")
+
+
+def evaluate(predicted, gold, window_sizes=(3,), metrics=METRICS, n_t=2):
+    """
+    Scores predicted against gold segmentations with several metrics and window sizes in one pass. All documents
+    are concatenated and every window count is a difference of cumulative boundary counts, so each metric and
+    window size costs O(n) over the whole batch.
+
+    :param predicted: binary tile vector [1,0,0,1, ...] or list of them, one per document
+    :param gold: gold vector or list of vectors of the same lengths
+    :param window_sizes: list of window sizes for WindowDiff and Pk, each smaller than every document
+    :param metrics: metrics to compute, any of 'window_diff', 'pk' (both lower is better) and 'b' (higher is better)
+    :param n_t: maximum distance plus one at which boundary similarity counts a boundary as a near miss
+    :return: dictionary from metric to array: (documents, window sizes) for 'window_diff' and 'pk', (documents,)
+        for 'b'
+    """
+    predicted = _as_batch(predicted)
+    gold = _as_batch(gold)
+    window_sizes = list(window_sizes)
+    check_lengths([len(doc) for doc in predicted], [len(doc) for doc in gold], window_sizes)
+
+    lengths = numpy.array([len(doc) for doc in gold], dtype=numpy.int64)
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype(numpy.int64)
+    doc_ids = numpy.repeat(numpy.arange(len(gold)), lengths)
+    positions = numpy.arange(lengths.sum()) - starts[doc_ids]
+    gold_prefix = numpy.concatenate(([0], numpy.cumsum(numpy.concatenate(gold + [numpy.zeros(0, numpy.int64)]))))
+    pred_prefix = numpy.concatenate(([0], numpy.cumsum(numpy.concatenate(predicted + [numpy.zeros(0, numpy.int64)]))))
+
+    results = {}
+    for metric in metrics:
+        if metric == 'b':
+            results[metric] = numpy.array([boundary_similarity(pred_doc, gold_doc, n_t)
+                                           for pred_doc, gold_doc in zip(predicted, gold)])
+            continue
+        if metric not in METRICS:
+            raise ValueError("Unknown metric '" + str(metric) + "'. Expected one of: " + ", ".join(METRICS))
+        # Pk compares sentences i and i+k, i.e. boundaries at i+1..i+k; WindowDiff counts boundaries at i..i+k-1
+        shift = 1 if metric == 'pk' else 0
+        scores = numpy.zeros((len(gold), len(window_sizes)))
+        for column, k in enumerate(window_sizes):
+            valid = positions < lengths[doc_ids] - k
+            window_starts = numpy.flatnonzero(valid) + shift
+            gold_counts = gold_prefix[window_starts + k] - gold_prefix[window_starts]
+            pred_counts = pred_prefix[window_starts + k] - pred_prefix[window_starts]
+            if metric == 'pk':
+                errors = (gold_counts == 0) != (pred_counts == 0)
+            else:
+                errors = gold_counts != pred_counts
+            error_counts = numpy.bincount(doc_ids[valid], weights=errors, minlength=len(gold))
+            scores[:, column] = (1.0 / (lengths - float(k))) * error_counts
+        results[metric] = scores
+    return results
+
+
+def window_diff(predicted_tiles, gold_tiles, window_size):
+    """
+    WindowDiff (Pevzner & Hearst 2002) for one document, lower is better
+
+    :return: score as float, 0 =< score =< 1
+    """
+    return float(evaluate(predicted_tiles, gold_tiles, [window_size], ('window_diff',))['window_diff'][0, 0])
+
+
+def pk(predicted_tiles, gold_tiles, window_size):
+    """
+    Pk (Beeferman et al. 1999) for one document: the share of sentence pairs window_size apart that predicted and
+    gold disagree on placing in the same segment, lower is better
+
+    :return: score as float, 0 =< score =< 1
+    """
+    return float(evaluate(predicted_tiles, gold_tiles, [window_size], ('pk',))['pk'][0, 0])
+
+
+def boundary_similarity(predicted_tiles, gold_tiles, n_t=2):
+    """
+    Boundary similarity B (Fournier 2013) for one document, higher is better. Boundaries are the positions of 1's
+    after the first sentence. Exact matches cost nothing, a predicted and a gold boundary less than n_t apart are
+    paired as a near miss costing its distance divided by n_t, and every other boundary costs 1:
+    B = 1 - (additions + near miss costs) / (additions + near misses + matches)
+
+    :param predicted_tiles: binary tile vector [1,0,0,1, ...]
+    :param gold_tiles: gold vector of the same length
+    :param n_t: maximum distance plus one for near misses
+    :return: score as float, 0 =< score =< 1, 1 if neither has boundaries
+    """
+    return boundary_similarity_positions(numpy.flatnonzero(predicted_tiles[1:]) + 1,
+                                         numpy.flatnonzero(gold_tiles[1:]) + 1, n_t)
+
+
+def boundary_similarity_positions(predicted, gold, n_t=2):
+    """
+    Boundary similarity from sorted arrays of boundary positions, in O(b log b) for b boundaries
+    """
+    matched = numpy.intersect1d(predicted, gold, assume_unique=True)
+    predicted = numpy.setdiff1d(predicted, matched, assume_unique=True)
+    gold = numpy.setdiff1d(gold, matched, assume_unique=True)
+
+    # pair remaining boundaries closer than n_t, scanning both sorted lists once
+    near_misses = 0
+    near_miss_cost = 0.0
+    i = j = 0
+    while i < len(predicted) and j < len(gold):
+        distance = abs(predicted[i] - gold[j])
+        if distance < n_t:
+            near_misses += 1
+            near_miss_cost += distance / float(n_t)
+            i += 1
+            j += 1
+        elif predicted[i] < gold[j]:
+            i += 1
+        else:
+            j += 1
+    additions = len(predicted) + len(gold) - 2 * near_misses
+
+    total = additions + near_misses + len(matched)
+    if total == 0:
+        return 1.0
+    return 1.0 - (additions + near_miss_cost) / float(total)
+
+
+def _position_errors(predicted, gold, length, window_size, metric):
+    """
+    Error rate of WindowDiff or Pk from sorted boundary positions. Window i covers positions i..i+k-1 for
+    WindowDiff and i+1..i+k for Pk, and its boundary counts only change where a window edge crosses a boundary,
+    so only those O(b) break points are evaluated, each with a binary search.
+    """
+    shift = 1 if metric == 'pk' else 0
+    n_windows = length - window_size
+    bounds = numpy.concatenate((predicted, gold))
+    breaks = numpy.unique(numpy.concatenate(([0], bounds - shift - window_size + 1, bounds - shift + 1)))
+    breaks = breaks[(breaks >= 0) & (breaks < n_windows)]
+    lows = breaks + shift
+    highs = lows + window_size
+    gold_counts = numpy.searchsorted(gold, highs) - numpy.searchsorted(gold, lows)
+    pred_counts = numpy.searchsorted(predicted, highs) - numpy.searchsorted(predicted, lows)
+    if metric == 'pk':
+        errors = (gold_counts == 0) != (pred_counts == 0)
+    else:
+        errors = gold_counts != pred_counts
+    widths = numpy.diff(numpy.concatenate((breaks, [n_windows])))
+    return (1.0 / (length - float(window_size))) * (widths * errors).sum()
+
+
+def evaluate_positions(predicted, gold, window_sizes=(3,), metrics=METRICS, n_t=2):
+    """
+    Same as evaluate, for segmentations given as sorted boundary positions (boundaries.Segmentation), in
+    O(b log b) per document and window size for b boundaries, independent of document length
+
+    :param predicted: list of Segmentation
+    :param gold: list of Segmentation with the same lengths
+    :return: dictionary from metric to array, as in evaluate
+    """
+    check_lengths([doc.length for doc in predicted], [doc.length for doc in gold], window_sizes)
+    results = {}
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError("Unknown metric '" + str(metric) + "'. Expected one of: " + ", ".join(METRICS))
+        if metric == 'b':
+            results[metric] = numpy.array([boundary_similarity_positions(pred_doc.positions[pred_doc.positions > 0],
+                                                                         gold_doc.positions[gold_doc.positions > 0],
+                                                                         n_t)
+                                           for pred_doc, gold_doc in zip(predicted, gold)])
+            continue
+        scores = numpy.zeros((len(gold), len(window_sizes)))
+        for row, (pred_doc, gold_doc) in enumerate(zip(predicted, gold)):
+            for column, window_size in enumerate(window_sizes):
+                scores[row, column] = _position_errors(numpy.asarray(pred_doc.positions), numpy.asarray(gold_doc.positions),
+                                                       gold_doc.length, window_size, metric)
+        results[metric] = scores
+    return results
@@ -2,9 +2,127 @@
 lexical chain module for text tiling
 """
 
+from collections import Mapping
+import numpy
 from tile_reader import TileReader
 from scoring import boundarize, depth_scoring, window_diff
 
+# chains use only tags and lemmas of newline-tokenized sentences
+PIPELINE_PROFILE = 'tagger-only'
+
+
+# ======================================================================================================================
+# Chain engine
+# ======================================================================================================================
+class ChainIndex(object):
+    """
+    Inverted index from lemmas to the sentences containing them. A chain of a lemma is active at the gap after
+    sentence g if the lemma occurs in sentences i <= g < j at most window apart; this holds exactly for the gaps
+    between two consecutive occurrences at most window apart, so each lemma contributes disjoint intervals
+    [start, end) of gaps, one per pair of consecutive occurrences. Counts for all gaps follow from a difference
+    array over the interval ends.
+    """
+    def __init__(self, lemma_lists, lemmas=None):
+        """
+        :param lemma_lists: list of per-sentence lemma ID arrays, e.g. Document.lemma_lists
+        :param lemmas: optional table of lemma strings for the IDs, used when gap sets are materialized
+        """
+        self.n_sentences = len(lemma_lists)
+        self.lemmas = lemmas
+        lengths = [len(ids) for ids in lemma_lists]
+        ids = numpy.concatenate([numpy.asarray(ids, dtype=numpy.int64) for ids in lemma_lists] +
+                                [numpy.zeros(0, dtype=numpy.int64)])
+        sents = numpy.repeat(numpy.arange(self.n_sentences), lengths)
+
+        # postings: (lemma, sentence) pairs sorted by lemma, then sentence, without repeats within a sentence
+        order = numpy.lexsort((sents, ids))
+        ids, sents = ids[order], sents[order]
+        keep = numpy.ones(len(ids), dtype=bool)
+        keep[1:] = (ids[1:] != ids[:-1]) | (sents[1:] != sents[:-1])
+        ids, sents = ids[keep], sents[keep]
+
+        # consecutive occurrences of the same lemma
+        same = ids[1:] == ids[:-1]
+        self.chain_lemmas = ids[:-1][same]
+        self.starts = sents[:-1][same]
+        self.ends = sents[1:][same]
+        self.distances = self.ends - self.starts
+
+    @classmethod
+    def from_sentences(cls, sentences):
+        """
+        :param sentences: list of lists of lemma strings
+        :return: ChainIndex
+        """
+        table = {}
+        lemma_lists = [[table.setdefault(lemma, len(table)) for lemma in sent] for sent in sentences]
+        return cls(lemma_lists, sorted(table, key=table.get))
+
+    @property
+    def n_gaps(self):
+        return max(self.n_sentences - 1, 0)
+
+    def counts(self, window):
+        """
+        :param window: distance threshold within which chains are considered active
+        :return: array with the number of active chains at each gap
+        """
+        active = self.distances <= window
+        delta = numpy.bincount(self.starts[active], minlength=self.n_sentences + 1)[:self.n_sentences + 1] - \
+            numpy.bincount(self.ends[active], minlength=self.n_sentences + 1)[:self.n_sentences + 1]
+        return numpy.cumsum(delta)[:self.n_gaps]
+
+    def count_matrix(self, max_window):
+        """
+        Active chain counts for every window from 1 to max_window in one pass. A chain between occurrences d
+        sentences apart is active at every window of at least d, so the intervals are binned by distance into one
+        difference array per window and accumulated along both axes, in O(tokens + max_window * gaps).
+        :param max_window: largest distance threshold
+        :return: array of shape (max_window, gaps); row w - 1 holds the counts for window w
+        """
+        width = self.n_sentences + 1
+        active = self.distances <= max_window
+        distances = self.distances[active]
+        delta = numpy.bincount(distances * width + self.starts[active], minlength=(max_window + 1) * width) - \
+            numpy.bincount(distances * width + self.ends[active], minlength=(max_window + 1) * width)
+        delta = delta[:(max_window + 1) * width].reshape(max_window + 1, width)
+        return numpy.cumsum(numpy.cumsum(delta, axis=1), axis=0)[1:, :self.n_gaps]
+
+    def actives(self, window):
+        """
+        :param window: distance threshold within which chains are considered active
+        :return: ActiveChains mapping each gap to the set of its active lemmas, built on access
+        """
+        return ActiveChains(self, window)
+
+
+class ActiveChains(Mapping):
+    """
+    Read-only dictionary from gap index to the set of lemmas with an active chain there, as returned by
+    LexicalChains._get_actives. Sets are only built when looked up.
+    """
+    def __init__(self, index, window):
+        self.index = index
+        self.window = window
+        active = index.distances <= window
+        self._lemmas = index.chain_lemmas[active]
+        self._starts = index.starts[active]
+        self._ends = index.ends[active]
+
+    def __getitem__(self, gap):
+        if not 0 <= gap < self.index.n_gaps:
+            raise KeyError(gap)
+        ids = self._lemmas[(self._starts <= gap) & (self._ends > gap)]
+        if self.index.lemmas is None:
+            return set(ids.tolist())
+        return set(self.index.lemmas[lemma] for lemma in ids)
+
+    def __iter__(self):
+        return iter(xrange(self.index.n_gaps))
+
+    def __len__(self):
+        return self.index.n_gaps
+
 
 # ======================================================================================================================
 # Main
@@ -13,6 +131,7 @@ class LexicalChains(object):
 
     def __init__(self):
         self.sentences = []
+        self.index = None
         self.actives = {}
         self.gap_scores = []
         self.boundary_vector = []
@@ -27,10 +146,45 @@ class LexicalChains(object):
         :return: void
         """
         self.sentences = self._preproc(sents, pos_filter)
-        self.actives = self._get_actives(self.sentences, window)
-        self.gap_scores = [len(self.actives[k]) for k in self.actives.keys()]
+        self.index = ChainIndex.from_sentences(self.sentences)
+        self.actives = self.index.actives(window)
+        self.gap_scores = self.index.counts(window).tolist()
         self.boundary_vector = self._get_boundaries(self.gap_scores, boundary_type)
 
+    def analyze_document(self, document, window=4, pos_filter=('PUNCT', 'SYM', 'SPACE', 'DET'),
+                         boundary_type='liberal'):
+        """
+        Set attributes from a document.Document instead of spacy-analyzed sentences
+        :param document: Document, e.g. from TileReader.build_document
+        :param window: (int) distance threshold within which chains are considered active
+        :param boundary_type: (str) 'liberal' or 'conservative' boundary scoring
+        :param pos_filter: (tuple) spacy pos_ labels to exclude (i.e. a pos-based stoplist)
+        :return: void
+        """
+        lemma_lists = document.lemma_lists(~document.mask(pos_filter))
+        self.sentences = [list(document.lemmas[lemma_ids]) for lemma_ids in lemma_lists]
+        self.index = ChainIndex(lemma_lists, document.lemmas)
+        self.actives = self.index.actives(window)
+        self.gap_scores = self.index.counts(window).tolist()
+        self.boundary_vector = self._get_boundaries(self.gap_scores, boundary_type)
+
+    def window_scores(self, max_window):
+        """
+        Gap scores of the analyzed document for every window from 1 to max_window, see ChainIndex.count_matrix
+        :param max_window: (int) largest distance threshold
+        :return: array of shape (max_window, gaps); row w - 1 holds the gap scores for window w
+        """
+        return self.index.count_matrix(max_window)
+
+    def window_boundaries(self, max_window, boundary_type='liberal'):
+        """
+        Boundary vectors of the analyzed document for every window from 1 to max_window
+        :param max_window: (int) largest distance threshold
+        :param boundary_type: (str) 'liberal' or 'conservative' boundary scoring
+        :return: list of boundary vectors; entry w - 1 is the boundary_vector analyze would give for window w
+        """
+        return [self._get_boundaries(scores.tolist(), boundary_type) for scores in self.window_scores(max_window)]
+
     @staticmethod
     def _preproc(sentences, pos_filter):
         """
@@ -49,34 +203,9 @@ class LexicalChains(object):
         Get active lexical chains for each gap between sentences
         :param sents: list of tokenized sentences
         :param window: difference threshold over which lexical chains are considered active
-        :return: dictionary containing active lexical chains for each sentence transition
-        """
-        # initialize active chains dictionary
-        actives = {}
-        for i in xrange(len(sents)-1):
-            actives[i] = set()
-
-        # loop over all sentences
-        for sent in sents:
-            # get index and unique tokens from current sentence
-            i = sents.index(sent)
-            uniques_i = set(sent)
-
-            # loop over all sentences within dist thresh of current
-            for diff in xrange(window, 0, -1):
-                # back off diff when there are less sentences left than dist thresh
-                while not i + diff < len(sents):
-                    diff -= 1
-                # find shared tokens between current sent[i] and sent[i+diff]
-                n = i + diff
-                uniques_n = set(sents[n])
-                intersection = uniques_i.intersection(uniques_n)
-
-                # add the intersections to all affected transitions between sent[i] and sent[i+diff]
-                for k in list(xrange(diff)):
-                    [actives[i+k].add(word) for word in intersection]
-
-        return actives
+        :return: dictionary-like ActiveChains containing active lexical chains for each sentence transition
+        """
+        return ChainIndex.from_sentences(sents).actives(window)
 
     @staticmethod
     def _get_boundaries(scores, boundary_type):
@@ -126,7 +255,7 @@ if __name__ == "__main__":
 
 
     # Instantiate TileReader
-    reader = TileReader()
+    reader = TileReader(profile=PIPELINE_PROFILE)
     reader.read(doc_path, newline_tokenization=True)
     sents = reader.sentences
 
@@ -0,0 +1,113 @@
+"""
+process-wide registry of spaCy pipelines, loaded lazily on first use and shared by all modules
+"""
+
+import threading
+import time
+
+# Named pipeline profiles: the spaCy components each profile switches off. Tilers declare the profile they need
+PROFILES = {
+    'tagger-only': ('parser', 'ner'),
+    'tagger+parser': ('ner',),
+    'full': (),
+}
+
+_pipelines = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def get_nlp(name='en', **overrides):
+    """
+    Returns the shared pipeline for a model name and spacy.load overrides, loading it on first use.
+    Safe to call from several threads; the model is loaded only once per process.
+
+    :param name: model name or path passed to spacy.load
+    :param overrides: keyword overrides passed to spacy.load, e.g. entity=False
+    :return: spaCy Language object
+    """
+    key = (name, tuple(sorted(overrides.items())))
+    nlp = _pipelines.get(key)
+    if nlp is None:
+        with _lock:
+            nlp = _pipelines.get(key)
+            if nlp is None:
+                import spacy
+                rss_before = _rss_bytes()
+                start = time.time()
+                nlp = spacy.load(name, **overrides)
+                _load_stats[key] = {'name': name,
+                                    'overrides': dict(overrides),
+                                    'seconds': time.time() - start,
+                                    'memory_bytes': _rss_bytes() - rss_before}
+                _pipelines[key] = nlp
+    return nlp
+
+
+def get_profile(profile='full', name='en'):
+    """
+    Returns the shared pipeline for a model with the components a profile does not need disabled
+
+    :param profile: name of a profile in PROFILES
+    :param name: model name or path passed to spacy.load
+    :return: spaCy Language object
+    """
+    if profile not in PROFILES:
+        raise ValueError("Unknown pipeline profile '" + str(profile) + "'. Expected one of: " + ", ".join(sorted(PROFILES)))
+    import spacy
+    disabled = PROFILES[profile]
+    if int(spacy.__version__.split('.')[0]) >= 2:
+        return get_nlp(name, disable=disabled) if disabled else get_nlp(name)
+    # spaCy 1.x takes one boolean override per component, and calls the entity recognizer 'entity'
+    overrides = dict(('entity' if component == 'ner' else component, False) for component in disabled)
+    return get_nlp(name, **overrides)
+
+
+def resolve_profile(profile, newline_tokenization):
+    """
+    Returns the profile to parse with: sentence boundaries come from the parser, so a profile without it is
+    upgraded to 'tagger+parser' unless newline tokenization already supplies the sentence splits
+
+    :param profile: name of a profile in PROFILES
+    :param newline_tokenization: boolean, whether each line is a sentence
+    :return: profile name
+    """
+    if not newline_tokenization and 'parser' in PROFILES.get(profile, ()):
+        return 'tagger+parser'
+    return profile
+
+
+def load_stats():
+    """
+    :return: list of dictionaries with name, overrides, seconds and memory_bytes for each pipeline loaded so far
+    """
+    return [_load_stats[key] for key in sorted(_load_stats)]
+
+
+def report():
+    """
+    :return: string with one line of load time and memory growth per loaded pipeline
+    """
+    lines = []
+    for stats in load_stats():
+        overrides = ", ".join("%s=%s" % item for item in sorted(stats['overrides'].items()))
+        lines.append("%s(%s): %.2f s, %.1f MB" % (stats['name'], overrides, stats['seconds'],
+                                                  stats['memory_bytes'] / 1024.0 / 1024.0))
+    return "\n".join(lines)
+
+
+def _rss_bytes():
+    """
+    Resident set size of this process, falling back to peak RSS where /proc is unavailable
+    """
+    try:
+        import os
+        with open('/proc/self/statm') as infile:
+            return int(infile.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
@@ -0,0 +1,179 @@
+"""
+content-addressed on-disk cache of spaCy parses for TileReader
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import zlib
+
+
+class ParseCache(object):
+    """
+    Persistent store of serialized spaCy parses, keyed by a hash of the text, the tokenization mode and the model
+    identity. Each parsed unit (a sentence with newline tokenization, else the whole text) is stored once as a
+    compressed blob addressed by its own hash, so sentences repeated across documents share storage. Documents are
+    evicted least recently used first once the blobs exceed max_bytes. Changes to the index are kept in memory
+    until flush is called; blobs are written immediately, so blobs of a process that died before flushing are not
+    in the index and are removed when the cache is next opened. Not safe for concurrent writers.
+    """
+    def __init__(self, directory, max_bytes=1024 ** 3):
+        """
+        :param directory: cache directory, created if missing
+        :param max_bytes: size cap for stored blobs in bytes
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.index_file = os.path.join(directory, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        # min-heap of (last use, key) for eviction, built on the first eviction; entries whose last use is stale
+        # are skipped when popped
+        self._lru = None
+        if not os.path.isdir(self.blob_dir):
+            os.makedirs(self.blob_dir)
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as infile:
+                self.index = json.load(infile)
+        else:
+            self.index = {"docs": {}, "blobs": {}, "size": 0, "clock": 0}
+        self._remove_orphans()
+
+    @staticmethod
+    def make_key(text, newline_tokenization, model_id):
+        """
+        :param text: unicode text as handed to the pipeline
+        :param newline_tokenization: boolean, tokenization mode of the parse
+        :param model_id: string identifying the model and pipeline that produced the parse
+        :return: hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(model_id.encode("utf8"))
+        digest.update(b"\0lines\0" if newline_tokenization else b"\0text\0")
+        digest.update(text.encode("utf8"))
+        return digest.hexdigest()
+
+    def get(self, key, vocab):
+        """
+        :param key: key from make_key
+        :param vocab: spaCy Vocab to rebuild Docs with
+        :return: list of spaCy Docs, or None if the key is not cached
+        """
+        entry = self.index["docs"].get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        from spacy.tokens import Doc
+        try:
+            docs = [Doc(vocab).from_bytes(zlib.decompress(self._read_blob(digest))) for digest in entry["blobs"]]
+        except Exception:
+            # blob removed behind our back, truncated or corrupt: zlib and spaCy raise various errors, so forget
+            # the document on any of them
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._touch(key)
+        self.hits += 1
+        return docs
+
+    def put(self, key, docs):
+        """
+        Stores parsed Docs under key, then evicts least recently used documents over the size cap
+
+        :param key: key from make_key
+        :param docs: list of spaCy Docs
+        :return: void
+        """
+        if key in self.index["docs"]:
+            self._touch(key)
+            return
+        digests = []
+        for doc in docs:
+            data = zlib.compress(doc.to_bytes())
+            digest = hashlib.sha1(data).hexdigest()
+            if digest not in self.index["blobs"]:
+                with open(self._blob_path(digest), "wb") as outfile:
+                    outfile.write(data)
+                self.index["blobs"][digest] = {"size": len(data), "refs": 0}
+                self.index["size"] += len(data)
+            self.index["blobs"][digest]["refs"] += 1
+            digests.append(digest)
+        self.index["docs"][key] = {"blobs": digests}
+        self._touch(key)
+        self._evict()
+
+    def flush(self):
+        """
+        Writes the index to disk if it changed since the last flush
+        """
+        if self.dirty:
+            self._save()
+            self.dirty = False
+
+    def clear(self):
+        for key in list(self.index["docs"]):
+            self._drop(key)
+        self._lru = None
+        self.flush()
+
+    def _touch(self, key):
+        used = self._tick()
+        self.index["docs"][key]["used"] = used
+        if self._lru is not None:
+            heapq.heappush(self._lru, (used, key))
+
+    def _evict(self):
+        if self.index["size"] <= self.max_bytes:
+            return
+        docs = self.index["docs"]
+        if self._lru is None or len(self._lru) > 2 * len(docs) + 64:
+            self._lru = [(entry["used"], key) for key, entry in docs.items()]
+            heapq.heapify(self._lru)
+        while self._lru and self.index["size"] > self.max_bytes:
+            used, key = heapq.heappop(self._lru)
+            if key in docs and docs[key]["used"] == used:
+                self._drop(key)
+
+    def _drop(self, key):
+        self.dirty = True
+        for digest in self.index["docs"].pop(key)["blobs"]:
+            blob = self.index["blobs"].get(digest)
+            if blob is None:
+                continue
+            blob["refs"] -= 1
+            if blob["refs"] <= 0:
+                del self.index["blobs"][digest]
+                self.index["size"] -= blob["size"]
+                if os.path.exists(self._blob_path(digest)):
+                    os.remove(self._blob_path(digest))
+
+    def _tick(self):
+        self.dirty = True
+        self.index["clock"] += 1
+        return self.index["clock"]
+
+    def _remove_orphans(self):
+        """
+        Deletes blob files the index does not list, written by a process that stopped before flushing
+        """
+        for digest in os.listdir(self.blob_dir):
+            if digest not in self.index["blobs"]:
+                os.remove(self._blob_path(digest))
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    def _read_blob(self, digest):
+        with open(self._blob_path(digest), "rb") as infile:
+            return infile.read()
+
+    def _save(self):
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, "w") as outfile:
+            json.dump(self.index, outfile)
+        if os.name == "nt" and os.path.exists(self.index_file):
+            os.remove(self.index_file)
+        os.rename(temp_file, self.index_file)
@@ -1,5 +1,7 @@
+import os
 import numpy
-from scipy.signal import argrelextrema
+import boundaries
+import evaluation
 
 
 def smoothing(scores, smoothing_window=2):
@@ -10,81 +12,237 @@ def smoothing(scores, smoothing_window=2):
     :param scores: list
     :return: list
     """
-    # normalize in a range of 0 to 1
-    min_score = min(scores)
-    max_score = max(scores)
-    normalized_scores = []
-    for score in scores:
-        normalized_scores.append((score - min_score) / float((max_score - min_score)))
+    return list(smooth_batch(numpy.array([scores], dtype=float), smoothing_window=smoothing_window)[0])
 
-    # smooth
-    smoothed_scores = []
-    for i in xrange(len(normalized_scores)):
-        window_scores = []
-        for j in xrange(smoothing_window / 2):
-            if i-(j+1) >= 0:  # take score from left
-                window_scores.append(normalized_scores[i - (j + 1)])
-            if i + (j+1) < len(normalized_scores):  # take score from right
-                window_scores.append((normalized_scores[i + (j + 1)]))
-        window_scores.append(normalized_scores[i])  # take score from this point
 
-        smoothed_scores.append(sum(window_scores) / float(len(window_scores)))
+def pad_scores(score_lists):
+    """
+    Packs gap score lists of different lengths into one zero-padded 2-D array with a mask of valid positions
+    :param score_lists: list(list)
+    :return: tuple(numpy.array, numpy.array)  # scores and boolean mask, both of shape (documents, longest length)
+    """
+    lengths = numpy.array([len(scores) for scores in score_lists])
+    mask = numpy.arange(lengths.max() if len(lengths) else 0) < lengths[:, None]
+    padded = numpy.zeros(mask.shape)
+    padded[mask] = numpy.concatenate([numpy.asarray(scores, dtype=float) for scores in score_lists]) if mask.any() else []
+    return padded, mask
+
+
+def smooth_batch(scores, mask=None, smoothing_window=2, kernel='flat', normalize=True, sigma=None, alpha=None):
+    """
+    Normalizes and smooths the gap scores of many documents at once. Each row of scores is one document, padded
+    past its end where mask is False. Windows are truncated at the ends of each document and averaged over the
+    positions they cover, so the 'flat' kernel reproduces the original smoothing. A row whose scores are all equal
+    normalizes to zeros.
+    :param scores: 2-D array of shape (documents, positions)
+    :param mask: boolean array of the same shape marking valid positions, None if all are valid
+    :param smoothing_window: int  # must be even; the window covers smoothing_window/2 positions on either side
+    :param kernel: 'flat'|'gaussian'|'ema'  # 'ema' is a causal exponential moving average
+    :param normalize: bool, whether to scale each row to the range 0 to 1 first
+    :param sigma: float, standard deviation of the gaussian kernel, defaults to half the window radius
+    :param alpha: float, weight of the current position for 'ema', defaults to 2/(smoothing_window+1)
+    :return: numpy.array of smoothed scores, 0 at masked positions
+    """
+    scores = numpy.array(scores, dtype=float, ndmin=2)
+    mask = numpy.ones(scores.shape, dtype=bool) if mask is None else numpy.asarray(mask, dtype=bool)
+    scores[~mask] = 0.0
+
+    if normalize:
+        min_scores = numpy.where(mask, scores, numpy.inf).min(axis=1)[:, None]
+        max_scores = numpy.where(mask, scores, -numpy.inf).max(axis=1)[:, None]
+        ranges = max_scores - min_scores
+        ranges[~numpy.isfinite(ranges) | (ranges == 0)] = 1.0
+        min_scores[~numpy.isfinite(min_scores)] = 0.0
+        scores = numpy.where(mask, (scores - min_scores) / ranges, 0.0)
 
-    return smoothed_scores
+    radius = smoothing_window // 2
+    if kernel == 'ema':
+        from scipy.signal import lfilter
+        if alpha is None:
+            alpha = 2.0 / (smoothing_window + 1)
+        # start each row from its first score, so that the first smoothed value equals it
+        initial = (1 - alpha) * scores[:, :1]
+        smoothed = lfilter([alpha], [1, alpha - 1], scores, axis=1, zi=initial)[0]
+        return numpy.where(mask, smoothed, 0.0)
+    elif kernel == 'flat':
+        weights = numpy.ones(2 * radius + 1)
+    elif kernel == 'gaussian':
+        if sigma is None:
+            sigma = max(radius, 1) / 2.0
+        offsets = numpy.arange(-radius, radius + 1)
+        weights = numpy.exp(-0.5 * (offsets / float(sigma)) ** 2)
+    else:
+        raise ValueError("Unknown smoothing kernel '" + str(kernel) + "'. Expected 'flat', 'gaussian' or 'ema'")
 
+    from scipy.ndimage import convolve1d
+    valid = mask.astype(float)
+    totals = convolve1d(scores * valid, weights, axis=1, mode='constant')
+    norms = convolve1d(valid, weights, axis=1, mode='constant')
+    norms[norms == 0] = 1.0
+    return numpy.where(mask, totals / norms, 0.0)
 
-def depth_scoring(scores):
+
+def depth_scoring(scores, climb=False):
     """
     this function takes a set of scores and returns depth scores for all local minima
     :param scores: list
+    :param climb: bool, measure depth against Hearst's peaks, see depth_scoring_batch
     :return: list(tuple)
     """
-    minima = set(argrelextrema(numpy.array(scores), numpy.less)[0])
-    maxima = set(argrelextrema(numpy.array(scores), numpy.greater)[0])
-    last_maxima = 0
-    depth_scores = []  # a list of tuples (index_of_minima, depth_score_at_minima)
-    for i in xrange(len(scores)):
-        if i in maxima:
-            last_maxima = i
+    depths, minima = depth_scoring_batch(numpy.array([scores], dtype=float), climb=climb)
+    return [(int(i), float(depths[0, i])) for i in numpy.flatnonzero(minima[0])]
+
 
-        if i in minima:
-            # find the next maxima
-            next_maxima = None
-            count = 0
-            while next_maxima is None:
-                count += 1
-                if i + count in maxima:
-                    next_maxima = i + count
-                elif i + count == len(scores) - 1:
-                    next_maxima = i + count
-            depth_score = (scores[last_maxima] - scores[i]) + (scores[next_maxima] - scores[i])
-            depth_scores.append((i, depth_score))
+def depth_scoring_batch(scores, mask=None, climb=False):
+    """
+    Depth scores for the local minima of many score curves at once, in linear time. A local minimum is a position
+    strictly lower than both neighbours; its depth is (left peak - minimum) + (right peak - minimum). By default
+    the left peak is the closest strict local maximum before it (else the first position) and the right peak the
+    closest one after it (else the last position). With climb=True the peaks are found as in Hearst (1997), by
+    climbing from the minimum in each direction while the scores keep increasing.
+    :param scores: 2-D array of shape (documents, positions), padded past the end of each document
+    :param mask: boolean array of the same shape marking valid positions, None if all are valid
+    :param climb: bool
+    :return: tuple(numpy.array, numpy.array)  # depth scores (0 off minima) and boolean mask of local minima
+    """
+    scores = numpy.array(scores, dtype=float, ndmin=2)
+    if mask is None:
+        mask = numpy.ones(scores.shape, dtype=bool)
+    n_docs, width = scores.shape
+    index = numpy.broadcast_to(numpy.arange(width), scores.shape)
+    last = (mask.sum(axis=1) - 1)[:, None]
 
-    return depth_scores
+    # comparisons with each neighbour, False where the neighbour is outside the document
+    has_left = (index > 0) & mask
+    has_right = (index < last) & mask
+    left = numpy.zeros(scores.shape)
+    right = numpy.zeros(scores.shape)
+    left[:, 1:] = scores[:, :-1]
+    right[:, :-1] = scores[:, 1:]
+    minima = has_left & has_right & (left > scores) & (right > scores)
 
+    if climb:
+        left_starts = ~has_left | (left <= scores)
+        right_stops = ~has_right | (right <= scores)
+    else:
+        maxima = has_left & has_right & (left < scores) & (right < scores)
+        left_starts = maxima
+        right_stops = maxima | (index >= last)
+    left_peaks = numpy.maximum.accumulate(numpy.where(left_starts, index, 0), axis=1)
+    right_peaks = numpy.minimum.accumulate(numpy.where(right_stops, index, width - 1)[:, ::-1], axis=1)[:, ::-1]
+    right_peaks = numpy.minimum(right_peaks, last)
 
-def boundarize(depth_scores, type='liberal'):
+    rows = numpy.arange(n_docs)[:, None]
+    depths = (scores[rows, left_peaks] - scores) + (scores[rows, right_peaks] - scores)
+    return numpy.where(minima, depths, 0.0), minima
+
+
+def boundarize(depth_scores, type='liberal', n_segments=None):
     """
     This function takes the depth scores and returns a list of indices where the boundaries should be. Has two
     modes: 'liberal' and 'conservative'.
     :param depth_scores: list(tuple)
     :param type: 'liberal'|'conservative'
+    :param n_segments: int, if given, the n_segments - 1 deepest minima are returned instead, see threshold_path
     :return: list
     """
-    average = numpy.mean([depth_score for i, depth_score in depth_scores])
-    deviation = numpy.std([depth_score for i, depth_score in depth_scores])
+    if n_segments is not None:
+        gaps = threshold_path(depth_scores)[0]
+        return sorted(int(gap) for gap in gaps[:max(n_segments - 1, 0)])
+    if type not in ('liberal', 'conservative'):
+        return []
+
+    gaps = [i for i, depth_score in depth_scores]
+    depths = numpy.array([[depth_score for i, depth_score in depth_scores]], dtype=float)
+    bounds = boundarize_batch(depths, numpy.ones(depths.shape, dtype=bool), type)[0]
+    return [gaps[j] for j in numpy.flatnonzero(bounds)]
+
+
+def boundarize_batch(depths, minima, boundary_type='liberal'):
+    """
+    boundarize for many depth score curves at once: a local minimum is a boundary if its depth exceeds the mean
+    depth of its row's minima minus their standard deviation ('liberal') or half of it ('conservative')
+    :param depths: 2-D array of depth scores, as from depth_scoring_batch
+    :param minima: boolean array of the same shape marking local minima
+    :param boundary_type: 'liberal'|'conservative'
+    :return: boolean array marking boundary gaps
+    """
+    counts = minima.sum(axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        means = numpy.where(minima, depths, 0.0).sum(axis=1) / counts
+        deviations = numpy.sqrt(numpy.where(minima, (depths - means[:, None]) ** 2, 0.0).sum(axis=1) / counts)
+    if boundary_type == 'conservative':
+        deviations = deviations / 2.0
+    with numpy.errstate(invalid='ignore'):
+        return minima & (depths > (means - deviations)[:, None])
+
+
+def threshold_path(depth_scores):
+    """
+    Sorts the depth scores once to give the boundaries of every threshold: the gaps with a depth score of at least
+    thresholds[j] are gaps[:cuts[j]]. Gaps of equal depth are ordered by position, so any prefix gaps[:n] is the
+    boundary set of n boundaries, but only the prefixes in cuts are reachable with a threshold.
+    :param depth_scores: list(tuple)  # as returned by depth_scoring
+    :return: tuple(numpy.array, numpy.array, numpy.array)  # gaps by decreasing depth, thresholds (from infinity,
+        for no boundaries, down to the lowest depth) and the number of boundaries for each threshold
+    """
+    gaps = numpy.array([i for i, depth_score in depth_scores], dtype=numpy.int64)
+    depths = numpy.array([depth_score for i, depth_score in depth_scores], dtype=float)
+    order = numpy.lexsort((gaps, -depths))
+    gaps, depths = gaps[order], depths[order]
+    last_of_tie = numpy.flatnonzero(numpy.append(depths[1:] != depths[:-1], True)) if len(depths) else []
+    cuts = numpy.concatenate(([0], numpy.asarray(last_of_tie, dtype=numpy.int64) + 1))
+    thresholds = numpy.concatenate(([numpy.inf], depths[cuts[1:] - 1]))
+    return gaps, thresholds, cuts
+
+
+def score_threshold_path(depth_scores, gold_tiles, window_size, offset=1, metric='window_diff'):
+    """
+    WindowDiff or Pk against gold for the boundaries of every threshold of threshold_path. Boundaries are added
+    one at a time in order of decreasing depth, and each addition only updates the error count of the window_size
+    windows that contain it, so the whole path costs O(n + b * window_size) for n sentences and b minima.
+    :param depth_scores: list(tuple)  # as returned by depth_scoring
+    :param gold_tiles: gold list of 1's and 0's, one per sentence
+    :param window_size: integer, must be smaller than text length in tiles
+    :param offset: int, sentence that begins a tile when gap 0 is a boundary, e.g. 1 for LexicalChains
+    :param metric: 'window_diff'|'pk'
+    :return: tuple(numpy.array, numpy.array, numpy.array)  # thresholds, numbers of boundaries and scores, one
+        entry per threshold
+    """
+    if metric not in ('window_diff', 'pk'):
+        raise ValueError("Unknown metric '" + str(metric) + "'. Expected 'window_diff' or 'pk'")
+    gold = numpy.asarray(gold_tiles, dtype=numpy.int64)
+    length = len(gold)
+    evaluation.check_lengths([length], [length], [window_size])
+    gaps, thresholds, cuts = threshold_path(depth_scores)
+
+    # window i covers sentences i..i+k-1 for WindowDiff and i+1..i+k for Pk, as in evaluation.evaluate
+    shift = 1 if metric == 'pk' else 0
+    n_windows = length - window_size
+    starts = numpy.arange(n_windows) + shift
+    gold_prefix = numpy.concatenate(([0], numpy.cumsum(gold)))
+    gold_counts = gold_prefix[starts + window_size] - gold_prefix[starts]
+    pred_counts = ((starts <= 0) & (starts + window_size > 0)).astype(numpy.int64)
 
-    boundaries = []
-    if type == 'liberal':
-        for i, depth_score in depth_scores:
-            if depth_score > average - deviation:
-                boundaries.append(i)
-    elif type == 'conservative':
-        for i, depth_score in depth_scores:
-            if depth_score > average - (deviation / 2.0):
-                boundaries.append(i)
+    def window_errors(gold_count, pred_count):
+        if metric == 'pk':
+            return (gold_count == 0) != (pred_count == 0)
+        return gold_count != pred_count
 
-    return boundaries
+    errors = int(numpy.count_nonzero(window_errors(gold_counts, pred_counts)))
+    error_path = numpy.zeros(len(gaps) + 1, dtype=numpy.int64)
+    error_path[0] = errors
+    for step, gap in enumerate(gaps):
+        position = gap + offset
+        if 0 < position < length:
+            low = max(position - shift - window_size + 1, 0)
+            high = min(position - shift + 1, n_windows)
+            if low < high:
+                before = numpy.count_nonzero(window_errors(gold_counts[low:high], pred_counts[low:high]))
+                pred_counts[low:high] += 1
+                errors += numpy.count_nonzero(window_errors(gold_counts[low:high], pred_counts[low:high])) - before
+        error_path[step + 1] = errors
+    return thresholds, cuts, error_path[cuts] / float(n_windows)
 
 
 def find_boundaries(scores, smoothing_window=2, type='liberal'):
@@ -113,46 +271,144 @@ def window_diff(predicted_tiles, gold_tiles, window_size):
     :return: score as float, 0 =< score =< 1
     """
 
-    errors = 0
     if window_size > len(gold_tiles):
         raise IndexError("Window size " + str(window_size) + " too large for text length " + str(len(gold_tiles)) + " tiles.\n")
     if len(predicted_tiles) != len(gold_tiles):
         raise IndexError("Gold tiles and predicted tiles must have same lengt. Found: " + str(len(gold_tiles)) + " gold tiles but " + str(len(predicted_tiles)) + " predicted tiles \n")
 
-    for index, tile in enumerate(gold_tiles[:len(gold_tiles)-window_size]):
-        gold_boundaries = sum(gold_tiles[index:index+window_size])
-        predicted_boundaries = sum(predicted_tiles[index:index+window_size])
-        if gold_boundaries != predicted_boundaries:
-            errors += 1
+    return evaluation.window_diff(predicted_tiles, gold_tiles, window_size)
+
+
+# gold segmentations of the current scoring run or sweep, set once per worker process by init_golds
+_golds = None
+
+
+def read_golds(gold_files, names=boundaries.GUM_5_DOCS):
+    """
+    :param gold_files: list of gold file names in any format read by boundaries.read
+    :param names: document names for the lines of files without names
+    :return: list(tuple)  # (file base name, OrderedDict from document name to Segmentation), one per gold file
+    """
+    return [(os.path.basename(filename), boundaries.read(filename, names)) for filename in gold_files]
+
+
+def init_golds(golds):
+    """
+    Pool initializer sharing the gold segmentations from read_golds with the jobs of a worker process
+    """
+    global _golds
+    _golds = golds
+
+
+def worker_golds():
+    """
+    :return: the gold segmentations set by init_golds in this process
+    """
+    return _golds
+
+
+def _score_file(job):
+    """
+    Scores one prediction file against every gold standard in _golds
+    :param job: tuple(str, list, list, list)  # file name, window sizes, metrics, default document names
+    :return: list(dict)  # one row per gold standard and document
+    """
+    filename, window_sizes, metrics, names = job
+    predicted = boundaries.read(filename, names)
+    system = boundaries.system_name(filename)
+    rows = []
+    for gold_name, gold in _golds:
+        pairs = [(name, predicted[name], gold[name]) for name in gold if name in predicted]
+        scored = [(name, pred, gold_doc) for name, pred, gold_doc in pairs
+                  if pred.length == gold_doc.length and max(window_sizes) < gold_doc.length]
+        results = evaluation.evaluate_positions([pred for name, pred, gold_doc in scored],
+                                                [gold_doc for name, pred, gold_doc in scored],
+                                                window_sizes, metrics) if scored else {}
+        row_index = dict((name, row) for row, (name, pred, gold_doc) in enumerate(scored))
+        for name, pred, gold_doc in pairs:
+            row = {'system': system, 'gold': gold_name, 'doc': name, 'scores': None}
+            if name in row_index:
+                row['scores'] = dict((metric, results[metric][row_index[name]]) for metric in metrics)
+            else:
+                row['note'] = "skipped: %d predicted vs %d gold sentences" % (pred.length, gold_doc.length)
+            rows.append(row)
+        if scored:
+            rows.append({'system': system, 'gold': gold_name, 'doc': 'mean',
+                         'scores': dict((metric, results[metric].mean(axis=0)) for metric in metrics)})
+    return rows
+
+
+def score_corpus(predicted_files, gold_files, window_sizes=(3, 4), metrics=evaluation.METRICS, n_process=None,
+                 names=boundaries.GUM_5_DOCS):
+    """
+    Scores many prediction files against several gold standards. Each gold file is read once and shared with a
+    pool of worker processes, which score one prediction file each. Documents are matched by name; documents whose
+    lengths differ from the gold are reported as skipped.
+    :param predicted_files: list of file names in any format read by boundaries.read
+    :param gold_files: list of gold file names
+    :param window_sizes: list of WindowDiff and Pk window sizes
+    :param metrics: metrics from evaluation.METRICS
+    :param n_process: int, number of worker processes, None for one per CPU
+    :param names: document names for the lines of files without names
+    :return: list(dict)  # rows with system, gold, doc and scores (metric to value or array over window sizes), or
+        a note instead of scores; each system and gold standard ends with a 'mean' row
+    """
+    from multiprocessing import Pool
+
+    golds = read_golds(gold_files, names)
+    jobs = [(filename, list(window_sizes), list(metrics), list(names)) for filename in predicted_files]
+    pool = Pool(n_process, init_golds, (golds,))
+    try:
+        results = pool.map(_score_file, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    return [row for rows in results for row in rows]
+
+
+def format_table(rows, window_sizes, metrics):
+    """
+    :return: str, rows of score_corpus as a tab separated table with one column per metric and window size
+    """
+    columns = []
+    for metric in metrics:
+        if metric == 'b':
+            columns.append(("b", metric, None))
+        else:
+            columns.extend((metric + "@" + str(size), metric, index) for index, size in enumerate(window_sizes))
+    lines = ["\t".join(["system", "gold", "doc"] + [title for title, metric, index in columns])]
+    for row in rows:
+        fields = [row['system'], row['gold'], row['doc']]
+        if row['scores'] is None:
+            fields.append(row['note'])
+        else:
+            fields.extend("%.4f" % (row['scores'][metric] if index is None else row['scores'][metric][index])
+                          for title, metric, index in columns)
+        lines.append("\t".join(fields))
+    return "\n".join(lines)
 
-    return (1/(len(gold_tiles)-float(window_size))) * errors
 
 if __name__ == "__main__":
+    import glob
     from argparse import ArgumentParser
 
-    parser = ArgumentParser()
-    parser.add_argument("-s", "--score", action="store_true", dest="score", help="Score using WindowDiff")
-    parser.add_argument("gold", action="store", help="File containing comma separated gold binary vector in one line for each document")
-    parser.add_argument("predicted", action="store", help="File containing comma separated predicted binary vector in one line for each document")
+    parser = ArgumentParser(description="Score predicted segmentations of a corpus against one or more gold standards")
+    parser.add_argument("predicted", nargs="*", help="Prediction files, one document per line in any format read by "
+                        "boundaries.read (default: data/GUM_5_prediction_*.txt)")
+    parser.add_argument("-g", "--gold", action="append", dest="gold", help="Gold file; repeat to score against "
+                        "several (default: data/GUM_5_gold_tiles.txt and data/boundaries_alternate)")
+    parser.add_argument("-w", "--windows", default="3,4", help="Comma separated WindowDiff and Pk window sizes")
+    parser.add_argument("-m", "--metrics", default=",".join(evaluation.METRICS), help="Comma separated metrics")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("-n", "--names", default=",".join(boundaries.GUM_5_DOCS),
+                        help="Document names for the lines of files without names")
 
     options = parser.parse_args()
-    gold_file = options.gold
-    predicted_file = options.predicted
-
-    gold = open(gold_file).read().replace("\r","").replace(" ","").split("\n")
-    predicted = open(predicted_file).read().replace("\r","").replace(" ","").split("\n")
-
-
-    if options.score:
-        for index in range(len(gold)):
-            gold_line = gold[index]
-            predicted_line = predicted[index]
-            gold_vec = list((int(bit)) for bit in gold_line.split(","))
-            predicted_vec = list((int(bit)) for bit in predicted_line.split(","))
-
-            #print "Line " + str(index)
-            print window_diff(gold_vec,predicted_vec,4)
-    #print window_diff([1, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 0, 1, 1],
-    #                  [1, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 1, 0, 1, 1], 4)
-    #print window_diff([1, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 0, 1, 1],
-    #                  [1, 1, 1, 0, 0, 1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 0, 1], 4)
+    predicted_files = options.predicted or sorted(glob.glob("data/GUM_5_prediction_*.txt"))
+    gold_files = options.gold or ["data/GUM_5_gold_tiles.txt", "data/boundaries_alternate"]
+    window_sizes = [int(size) for size in options.windows.split(",")]
+    metrics = options.metrics.split(",")
+
+    rows = score_corpus(predicted_files, gold_files, window_sizes, metrics, options.processes,
+                        options.names.split(","))
+    print format_table(rows, window_sizes, metrics)
@@ -0,0 +1,133 @@
+"""
+significance tests for comparing tiling systems over documents: bootstrap confidence intervals, paired bootstrap
+and approximate randomization, with every resample drawn at once as a NumPy index matrix
+"""
+
+from itertools import combinations
+import numpy
+import boundaries
+import evaluation
+
+
+def document_scores(predicted_files, gold_file, metric='window_diff', window_size=3, names=boundaries.GUM_5_DOCS):
+    """
+    Per-document scores of several systems against one gold standard. Only documents that every system has with
+    the gold length are kept, so that the scores are paired.
+    :param predicted_files: list of prediction file names in any format read by boundaries.read
+    :param gold_file: gold file name
+    :param metric: metric from evaluation.METRICS
+    :param window_size: int, window size for 'window_diff' and 'pk'
+    :param names: document names for the lines of files without names
+    :return: tuple(list, list, numpy.array)  # system names, document names, scores of shape (systems, documents)
+    """
+    gold = boundaries.read(gold_file, names)
+    predictions = [boundaries.read(filename, names) for filename in predicted_files]
+    systems = [boundaries.system_name(filename) for filename in predicted_files]
+    docs = [name for name in gold
+            if all(name in predicted and predicted[name].length == gold[name].length for predicted in predictions)]
+    scores = numpy.zeros((len(systems), len(docs)))
+    for row, predicted in enumerate(predictions):
+        results = evaluation.evaluate_positions([predicted[name] for name in docs], [gold[name] for name in docs],
+                                                [window_size], [metric])[metric]
+        scores[row] = results if metric == 'b' else results[:, 0]
+    return systems, docs, scores
+
+
+def _resample_indices(n_docs, n_resamples, random_state):
+    return random_state.randint(0, n_docs, size=(n_resamples, n_docs))
+
+
+def bootstrap_intervals(scores, n_resamples=10000, confidence=0.95, seed=None):
+    """
+    Percentile bootstrap confidence intervals of the mean score of each system. All systems share the same
+    resampled documents.
+    :param scores: array of shape (systems, documents)
+    :param n_resamples: int
+    :param confidence: float, coverage of the interval
+    :param seed: int, random seed
+    :return: numpy.array of shape (systems, 3)  # mean, lower and upper bound
+    """
+    scores = numpy.array(scores, dtype=float, ndmin=2)
+    indices = _resample_indices(scores.shape[1], n_resamples, numpy.random.RandomState(seed))
+    means = scores[:, indices].mean(axis=2)
+    tail = (1.0 - confidence) / 2.0 * 100
+    low, high = numpy.percentile(means, [tail, 100 - tail], axis=1)
+    return numpy.column_stack((scores.mean(axis=1), low, high))
+
+
+def paired_bootstrap(scores_a, scores_b, n_resamples=10000, seed=None):
+    """
+    Two-sided paired bootstrap test of the mean difference between two systems scored on the same documents. The
+    resampled differences are centred on zero to give the distribution under the null hypothesis.
+    :param scores_a: array of per-document scores of one system
+    :param scores_b: array of scores of the other system on the same documents
+    :return: tuple(float, float)  # mean difference a - b and p-value
+    """
+    differences = numpy.asarray(scores_a, dtype=float) - numpy.asarray(scores_b, dtype=float)
+    observed = differences.mean()
+    indices = _resample_indices(len(differences), n_resamples, numpy.random.RandomState(seed))
+    resampled = differences[indices].mean(axis=1) - observed
+    extreme = numpy.count_nonzero(numpy.abs(resampled) >= abs(observed) - 1e-12)
+    return observed, (extreme + 1.0) / (n_resamples + 1.0)
+
+
+def approximate_randomization(scores_a, scores_b, n_resamples=10000, seed=None):
+    """
+    Two-sided approximate randomization test: under the null hypothesis the two systems' scores on each document
+    are exchangeable, so each resample swaps them at random, i.e. flips the sign of the per-document difference.
+    :param scores_a: array of per-document scores of one system
+    :param scores_b: array of scores of the other system on the same documents
+    :return: tuple(float, float)  # mean difference a - b and p-value
+    """
+    differences = numpy.asarray(scores_a, dtype=float) - numpy.asarray(scores_b, dtype=float)
+    observed = differences.mean()
+    signs = numpy.random.RandomState(seed).randint(0, 2, size=(n_resamples, len(differences))) * 2 - 1
+    resampled = (signs * differences).mean(axis=1)
+    extreme = numpy.count_nonzero(numpy.abs(resampled) >= abs(observed) - 1e-12)
+    return observed, (extreme + 1.0) / (n_resamples + 1.0)
+
+
+def compare(systems, scores, n_resamples=10000, confidence=0.95, seed=None):
+    """
+    Runs all tests on per-document scores of several systems
+    :param systems: list of system names
+    :param scores: array of shape (systems, documents)
+    :return: tuple(dict, list)  # system to (mean, lower, upper), and one tuple of
+        (system a, system b, mean difference, bootstrap p-value, randomization p-value) per pair
+    """
+    scores = numpy.array(scores, dtype=float, ndmin=2)
+    intervals = bootstrap_intervals(scores, n_resamples, confidence, seed)
+    pairs = []
+    for a, b in combinations(range(len(systems)), 2):
+        difference, p_bootstrap = paired_bootstrap(scores[a], scores[b], n_resamples, seed)
+        p_randomization = approximate_randomization(scores[a], scores[b], n_resamples, seed)[1]
+        pairs.append((systems[a], systems[b], difference, p_bootstrap, p_randomization))
+    return dict((system, tuple(interval)) for system, interval in zip(systems, intervals)), pairs
+
+
+if __name__ == "__main__":
+    import glob
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Confidence intervals and pairwise significance tests for tiling systems")
+    parser.add_argument("predicted", nargs="*", help="Prediction files (default: data/GUM_5_prediction_*.txt)")
+    parser.add_argument("-g", "--gold", default="data/GUM_5_gold_tiles.txt", help="Gold file")
+    parser.add_argument("-m", "--metric", default="window_diff", choices=evaluation.METRICS)
+    parser.add_argument("-w", "--window", type=int, default=3, help="Window size for window_diff and pk")
+    parser.add_argument("-r", "--resamples", type=int, default=10000)
+    parser.add_argument("-c", "--confidence", type=float, default=0.95)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+
+    options = parser.parse_args()
+    predicted_files = options.predicted or sorted(glob.glob("data/GUM_5_prediction_*.txt"))
+    systems, docs, scores = document_scores(predicted_files, options.gold, options.metric, options.window)
+    intervals, pairs = compare(systems, scores, options.resamples, options.confidence, options.seed)
+
+    print "%s over %d documents, %d resamples" % (options.metric, len(docs), options.resamples)
+    print "\t".join(["system", "mean", "low", "high"])
+    for system in systems:
+        print "\t".join([system] + ["%.4f" % value for value in intervals[system]])
+    print
+    print "\t".join(["system a", "system b", "a - b", "p bootstrap", "p randomization"])
+    for a, b, difference, p_bootstrap, p_randomization in pairs:
+        print "\t".join([a, b, "%.4f" % difference, "%.4f" % p_bootstrap, "%.4f" % p_randomization])
@@ -0,0 +1,131 @@
+"""
+online boundary detection: gap scores are pushed one at a time, e.g. computed from TileReader.stream_blocks, and
+boundaries are emitted as soon as they are confirmed, holding only a bounded window of scores in memory
+"""
+
+from collections import deque
+import math
+
+
+class StreamingBoundaries(object):
+    """
+    Incremental counterpart of scoring.find_boundaries. Scores are smoothed with a flat window of
+    smoothing_window/2 positions on either side, so each smoothed score is known smoothing_window/2 scores after
+    its raw score. Local minima get depth scores as in scoring.depth_scoring: the right peak is the next strict
+    local maximum, or, if none is confirmed within lookahead smoothed scores, the highest score seen since the
+    minimum. The boundary threshold is the running mean of all depth scores so far minus their standard deviation
+    ('liberal') or half of it ('conservative'), so early decisions rest on fewer minima than the offline threshold.
+    Scores are not min-max normalized; this scales all depths alike and leaves the threshold test unchanged.
+    """
+    def __init__(self, smoothing_window=2, type='liberal', lookahead=10, offset=0):
+        """
+        :param smoothing_window: int, even, or None for no smoothing
+        :param type: 'liberal'|'conservative'
+        :param lookahead: int, smoothed scores to wait for a right peak, or None to wait until the end of the stream
+        :param offset: int, added to gap indices of emitted boundaries, e.g. the block size to get sentence indices
+            as in word_vecs
+        """
+        if type not in ('liberal', 'conservative'):
+            raise ValueError("Unknown boundary type '" + str(type) + "'. Expected 'liberal' or 'conservative'")
+        self.radius = (smoothing_window or 0) // 2
+        self.type = type
+        self.lookahead = lookahead
+        self.offset = offset
+        self.raw = deque(maxlen=2 * self.radius + 1)
+        self.n_scores = 0
+        self.n_smoothed = 0
+        self.previous = deque(maxlen=2)
+        self.left_peak = None
+        # minima waiting for their right peak: [position, score, left peak, highest score since]
+        self.pending = deque()
+        # running depth statistics (Welford)
+        self.n_depths = 0
+        self.depth_mean = 0.0
+        self.depth_m2 = 0.0
+
+    def push(self, score):
+        """
+        Adds the score of the next gap
+        :param score: float
+        :return: list of boundaries confirmed by this score, as gap index plus offset
+        """
+        self.raw.append(float(score))
+        self.n_scores += 1
+        # the window of the score radius positions back is all raw scores held, truncated at the start
+        if self.n_scores <= self.radius:
+            return []
+        return self._smoothed(sum(self.raw) / len(self.raw))
+
+    def flush(self):
+        """
+        Ends the stream: smooths the last scores with windows truncated at the end and settles all pending minima
+        against the last score
+        :return: list of the remaining boundaries
+        """
+        found = []
+        raw = list(self.raw)
+        for position in range(max(self.n_scores - self.radius, 0), self.n_scores):
+            window = raw[-(self.n_scores - max(position - self.radius, 0)):]
+            found += self._smoothed(sum(window) / len(window))
+        if self.previous:
+            last = self.previous[-1]
+            while self.pending:
+                found += self._settle(self.pending.popleft(), last)
+        return found
+
+    def _smoothed(self, value):
+        """
+        Takes the next smoothed score, classifying the one before it as a local minimum or maximum
+        """
+        found = []
+        if self.left_peak is None:
+            self.left_peak = value
+        if len(self.previous) == 2:
+            before, middle = self.previous
+            position = self.n_smoothed - 1
+            if before > middle < value:
+                self.pending.append([position, middle, self.left_peak, value])
+            elif before < middle > value:
+                while self.pending:
+                    found += self._settle(self.pending.popleft(), middle)
+                self.left_peak = middle
+        for minimum in self.pending:
+            minimum[3] = max(minimum[3], value)
+        while self.pending and self.lookahead is not None and self.n_smoothed - self.pending[0][0] >= self.lookahead:
+            minimum = self.pending.popleft()
+            found += self._settle(minimum, minimum[3])
+        self.previous.append(value)
+        self.n_smoothed += 1
+        return found
+
+    def _settle(self, minimum, right_peak):
+        """
+        Scores a minimum against its right peak and tests its depth against the running threshold
+        """
+        position, score, left_peak, highest = minimum
+        depth = (left_peak - score) + (right_peak - score)
+        self.n_depths += 1
+        delta = depth - self.depth_mean
+        self.depth_mean += delta / self.n_depths
+        self.depth_m2 += delta * (depth - self.depth_mean)
+        deviation = math.sqrt(self.depth_m2 / self.n_depths)
+        if self.type == 'conservative':
+            deviation /= 2.0
+        if depth > self.depth_mean - deviation:
+            return [position + self.offset]
+        return []
+
+
+def stream_boundaries(scores, smoothing_window=2, type='liberal', lookahead=10, offset=0):
+    """
+    Generator yielding boundaries from an iterable of gap scores as soon as each is confirmed, see
+    StreamingBoundaries
+    :param scores: iterable of float
+    :return: boundaries as gap index plus offset, in increasing order
+    """
+    detector = StreamingBoundaries(smoothing_window, type, lookahead, offset)
+    for score in scores:
+        for boundary in detector.push(score):
+            yield boundary
+    for boundary in detector.flush():
+        yield boundary
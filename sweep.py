@@ -0,0 +1,229 @@
+"""
+hyper-parameter sweep over the tilers: raw gap scores are computed once per document, method and block size, and
+every smoothing and boundarization setting is fanned out from them as batched array operations
+"""
+
+import os
+import re
+from itertools import product
+import numpy
+import boundaries
+import evaluation
+import scoring
+import tile_vintro
+import word_vecs
+from lexical_chains import ChainIndex
+from tile_reader import TileReader
+
+# pipeline profile for all methods: tags, lemmas and vectors; the reader adds the parser when sentences are not
+# newline tokenized
+PIPELINE_PROFILE = 'tagger-only'
+
+METHODS = ('vintro', 'vecs', 'chains')
+
+# whether each method reads newline tokenized sentences, as its tiler does
+NEWLINE_TOKENIZATION = {'vintro': False, 'vecs': True, 'chains': True}
+
+VOCAB_TAGS = {'vintro': ("NOUN", "PROPN", "VERB", "ADJ"), 'vecs': ("NOUN", "PROPN")}
+
+# POS tags whose tokens are dropped before building lexical chains, as in LexicalChains
+POS_FILTER = ('PUNCT', 'SYM', 'SPACE', 'DET')
+
+DEFAULT_GRID = {'block_sizes': {'vintro': (2, 3, 4, 5), 'vecs': (2, 3, 4, 5), 'chains': (2, 3, 4, 5, 6)},
+                'smoothing_windows': (None, 2, 4, 6),
+                'kernels': ('flat',),
+                'boundary_types': ('liberal', 'conservative')}
+
+
+def gap_scores(document, method, k):
+    """
+    Raw gap scores of a tiling method, before smoothing and boundarization
+    :param document: document.Document
+    :param method: 'vintro'|'vecs'|'chains'
+    :param k: int, block size: w of tile_vintro, block_length of word_vecs or window of LexicalChains
+    :return: numpy.array with one score per gap
+    """
+    if method == 'vintro':
+        return tile_vintro.gap_scores(document, k, VOCAB_TAGS[method])
+    elif method == 'vecs':
+        return word_vecs.gap_scores(word_vecs.sentence_embeddings(document, word_vecs.word_matrix(document)), k)
+    elif method == 'chains':
+        return ChainIndex(document.lemma_lists(~document.mask(POS_FILTER))).counts(k).astype(float)
+    raise ValueError("Unknown method '" + str(method) + "'. Expected one of: " + ", ".join(METHODS))
+
+
+def gap_offset(method, k):
+    """
+    :return: int, the sentence that begins a tile when a boundary is found at gap 0, as placed by each tiler
+    """
+    if method == 'vintro':
+        return k - 1
+    elif method == 'vecs':
+        return k
+    return 1
+
+
+def fan_out(curves, offsets, n_sentences, smoothing_windows=(None,), kernels=('flat',),
+            boundary_types=('liberal',)):
+    """
+    Boundary vectors for every smoothing and boundarization setting of several gap score curves of one document
+    :param curves: list of gap score arrays
+    :param offsets: list of gap offsets, one per curve, see gap_offset
+    :param n_sentences: int, length of the document in sentences
+    :param smoothing_windows: list of smoothing windows; None leaves the scores raw, as word_vecs and
+        LexicalChains do by default
+    :param kernels: list of scoring.smooth_batch kernels
+    :param boundary_types: list of 'liberal'|'conservative'
+    :return: tuple(list, numpy.array)  # settings as (curve index, smoothing window, kernel, boundary type), and
+        binary tile vectors of shape (settings, n_sentences)
+    """
+    scores, mask = scoring.pad_scores(curves)
+    settings = []
+    tiles = []
+    smoothings = [(None, None)] if None in smoothing_windows else []
+    smoothings += [(window, kernel) for window, kernel in product(smoothing_windows, kernels) if window is not None]
+    for window, kernel in smoothings:
+        smoothed = scores if window is None else scoring.smooth_batch(scores, mask, window, kernel)
+        depths, minima = scoring.depth_scoring_batch(smoothed, mask)
+        for boundary_type in boundary_types:
+            bounds = scoring.boundarize_batch(depths, minima, boundary_type)
+            for row, offset in enumerate(offsets):
+                positions = numpy.flatnonzero(bounds[row]) + offset
+                row_tiles = numpy.zeros(n_sentences, dtype=numpy.int64)
+                row_tiles[positions[positions < n_sentences]] = 1
+                row_tiles[0] = 1
+                settings.append((row, window, kernel if window is not None else None, boundary_type))
+                tiles.append(row_tiles)
+    return settings, numpy.array(tiles).reshape(len(tiles), n_sentences)
+
+
+def document_name(filename):
+    """
+    :return: str, the document name of a GUM_voyage_*_noheads.txt file, else the file name without extension
+    """
+    match = re.search(r"GUM_voyage_(\w+?)_noheads", os.path.basename(filename))
+    return match.group(1) if match else os.path.splitext(os.path.basename(filename))[0]
+
+
+def _sweep_document(job):
+    """
+    Parses one document once per tokenization, computes all gap score curves and scores every setting against
+    every gold segmentation of matching length
+    :return: list of tuples (method, block size, smoothing window, kernel, boundary type, gold, scores), with
+        scores a dictionary from metric to value at the first window size
+    """
+    filename, grid, window_sizes, metrics = job
+    name = document_name(filename)
+    rows = []
+    documents = {}
+    for method in grid['methods']:
+        newline_tokenization = NEWLINE_TOKENIZATION[method]
+        if newline_tokenization not in documents:
+            reader = TileReader(profile=PIPELINE_PROFILE)
+            reader.read(filename, newline_tokenization=newline_tokenization)
+            documents[newline_tokenization] = reader.build_document(with_vectors='vecs' in grid['methods'],
+                                                                    release=True)
+        document = documents[newline_tokenization]
+        golds = [(gold_name, gold[name]) for gold_name, gold in scoring.worker_golds()
+                 if name in gold and gold[name].length == document.n_sentences]
+        block_sizes = [k for k in grid['block_sizes'][method] if 2 * k <= document.n_sentences]
+        if not golds or not block_sizes:
+            continue
+
+        if method == 'chains':
+            index = ChainIndex(document.lemma_lists(~document.mask(POS_FILTER)))
+            matrix = index.count_matrix(max(block_sizes)).astype(float)
+            curves = [matrix[k - 1] for k in block_sizes]
+        elif method == 'vecs':
+            # sentence embeddings do not depend on the block size
+            sent_vectors = word_vecs.sentence_embeddings(document, word_vecs.word_matrix(document))
+            curves = [word_vecs.gap_scores(sent_vectors, k) for k in block_sizes]
+        else:
+            curves = [gap_scores(document, method, k) for k in block_sizes]
+        settings, tiles = fan_out(curves, [gap_offset(method, k) for k in block_sizes], document.n_sentences,
+                                  grid['smoothing_windows'], grid['kernels'], grid['boundary_types'])
+        for gold_name, gold in golds:
+            gold_tiles = boundaries.to_tiles(gold)
+            results = evaluation.evaluate(list(tiles), [gold_tiles] * len(tiles), window_sizes, metrics)
+            for index, (curve, window, kernel, boundary_type) in enumerate(settings):
+                scores = dict((metric, float(results[metric][index] if metric == 'b' else results[metric][index, 0]))
+                              for metric in metrics)
+                rows.append((method, block_sizes[curve], window, kernel, boundary_type, gold_name, scores))
+    return rows
+
+
+def sweep(filenames, gold_files, grid=None, window_sizes=(3,), metrics=evaluation.METRICS, rank_by='window_diff',
+          n_process=None, names=boundaries.GUM_5_DOCS):
+    """
+    Scores a grid of tiler configurations on a corpus. Each worker process parses one document and computes the
+    raw gap scores once per method and block size; all smoothing and boundary settings are derived from them in
+    batches and scored against every gold standard whose document has the same number of sentences.
+    :param filenames: list of text files, named as GUM_voyage_<name>_noheads.txt or matching the gold names
+    :param gold_files: list of gold file names in any format read by boundaries.read
+    :param grid: dictionary overriding entries of DEFAULT_GRID, plus 'methods', a list from METHODS
+    :param window_sizes: WindowDiff and Pk window sizes; the first is used for the results
+    :param metrics: metrics from evaluation.METRICS
+    :param rank_by: metric to rank by; lower is better except for 'b'
+    :param n_process: int, number of worker processes, None for one per CPU
+    :param names: document names for the lines of gold files without names
+    :return: list of dictionaries with method, block_size, smoothing_window, kernel, boundary_type, gold, docs
+        (number of documents scored) and the mean of each metric, best first
+    """
+    from multiprocessing import Pool
+
+    full_grid = dict(DEFAULT_GRID, methods=METHODS)
+    full_grid.update(grid or {})
+    golds = scoring.read_golds(gold_files, names)
+    jobs = [(filename, full_grid, list(window_sizes), list(metrics)) for filename in filenames]
+    pool = Pool(n_process, scoring.init_golds, (golds,))
+    try:
+        results = pool.map(_sweep_document, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    totals = {}
+    for rows in results:
+        for row in rows:
+            totals.setdefault(row[:-1], []).append(row[-1])
+    table = []
+    for (method, k, window, kernel, boundary_type, gold_name), doc_scores in totals.items():
+        entry = {'method': method, 'block_size': k, 'smoothing_window': window, 'kernel': kernel,
+                 'boundary_type': boundary_type, 'gold': gold_name, 'docs': len(doc_scores)}
+        for metric in metrics:
+            entry[metric] = numpy.mean([scores[metric] for scores in doc_scores])
+        table.append(entry)
+    table.sort(key=lambda entry: (-entry['docs'], -entry[rank_by] if rank_by == 'b' else entry[rank_by]))
+    return table
+
+
+if __name__ == "__main__":
+    import glob
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Rank tiler configurations on a corpus")
+    parser.add_argument("files", nargs="*", help="Texts to tile (default: data/GUM_voyage_*_noheads.txt)")
+    parser.add_argument("-g", "--gold", action="append", dest="gold", help="Gold file; repeat for several "
+                        "(default: data/GUM_5_gold_tiles.txt and data/boundaries_alternate)")
+    parser.add_argument("-M", "--methods", default=",".join(METHODS), help="Comma separated methods")
+    parser.add_argument("-s", "--smoothing", default="none,2,4,6", help="Comma separated smoothing windows, "
+                        "'none' for raw scores")
+    parser.add_argument("-k", "--kernels", default="flat", help="Comma separated smoothing kernels")
+    parser.add_argument("-w", "--window", type=int, default=3, help="Window size for window_diff and pk")
+    parser.add_argument("-r", "--rank", default="window_diff", choices=evaluation.METRICS)
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    parser.add_argument("-t", "--top", type=int, default=20, help="Number of configurations to print")
+
+    options = parser.parse_args()
+    files = options.files or sorted(glob.glob("data/GUM_voyage_*_noheads.txt"))
+    gold_files = options.gold or ["data/GUM_5_gold_tiles.txt", "data/boundaries_alternate"]
+    grid = {'methods': options.methods.split(","),
+            'smoothing_windows': [None if window == "none" else int(window) for window in options.smoothing.split(",")],
+            'kernels': options.kernels.split(",")}
+
+    table = sweep(files, gold_files, grid, [options.window], rank_by=options.rank, n_process=options.processes)
+    columns = ['method', 'block_size', 'smoothing_window', 'kernel', 'boundary_type', 'gold', 'docs']
+    print "\t".join(columns + list(evaluation.METRICS))
+    for entry in table[:options.top]:
+        print "\t".join([str(entry[column]) for column in columns] +
+                        ["%.4f" % entry[metric] for metric in evaluation.METRICS])
@@ -1,16 +1,119 @@
-import spacy
 import re
-from collections import defaultdict
+from collections import defaultdict, deque
+from multiprocessing import Pool
+import numpy
+from document import Document, check_window
+from nlp_pool import PROFILES, get_profile, resolve_profile
 
-class TileReader:
 
-	def __init__(self):
-		self.nlp = spacy.load('en')
+# Pipeline held by each worker process of TileReader.read_many, loaded once per worker
+_worker_nlp = None
+
+# places where a long text may be cut for a parallel parse: any line break with newline tokenization, else only
+# paragraph breaks, i.e. runs of line breaks enclosing at least one blank line
+LINE_BREAK = re.compile(r"\n")
+PARAGRAPH_BREAK = re.compile(r"\n(?:[ \t\r]*\n)+")
+
+
+def _init_worker(profile):
+	global _worker_nlp
+	_worker_nlp = get_profile(profile)
+
+
+def _parse_batch(nlp, batch):
+	"""
+	Runs a batch of documents through a single spaCy pipe call
+
+	:param nlp: spaCy pipeline
+	:param batch: list of documents, each a list of text units (sentences or whole texts)
+	:return: list of documents, each a list of parsed spaCy Docs
+	"""
+	units = [unit for doc_units in batch for unit in doc_units]
+	parsed = list(nlp.pipe(units, batch_size=max(len(units), 1)))
+	docs = []
+	start = 0
+	for doc_units in batch:
+		docs.append(parsed[start:start + len(doc_units)])
+		start += len(doc_units)
+	return docs
+
+
+def _parse_job(batch):
+	"""
+	Worker side of TileReader.read_many: parses a batch and serializes the Docs for transfer
+	"""
+	return [[doc.to_bytes() for doc in docs] for docs in _parse_batch(_worker_nlp, batch)]
+
+
+def _join_docs(vocab, docs):
+	"""
+	Concatenates Docs parsed from consecutive pieces of a text into one Doc of the whole text. Token attributes are
+	copied with to_array/from_array, which stores heads relative to each token, so token indices, character offsets,
+	dependency arcs and sentence spans refer to the joined Doc.
+
+	:param vocab: spaCy Vocab shared by the Docs
+	:param docs: list of spaCy Docs in text order
+	:return: spaCy Doc
+	"""
+	from spacy.attrs import LEMMA, TAG, POS, HEAD, DEP, ENT_IOB, ENT_TYPE
+	from spacy.tokens import Doc
+	attrs = [LEMMA, TAG, POS, HEAD, DEP, ENT_IOB, ENT_TYPE]
+	words = [tok.orth_ for doc in docs for tok in doc]
+	spaces = [bool(tok.whitespace_) for doc in docs for tok in doc]
+	joined = Doc(vocab, words=words, spaces=spaces)
+	joined.from_array(attrs, numpy.concatenate([doc.to_array(attrs) for doc in docs]))
+	return joined
+
+
+def _batches(iterable, size):
+	batch = []
+	for item in iterable:
+		batch.append(item)
+		if len(batch) == size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+class TileReader(object):
+
+	def __init__(self, nlp=None, profile='full'):
+		self._nlp = nlp
+		self.profile = profile
 		self.doc = None
+		self.document = None
+		self.model_id = None
+		self.cache = None
 		self.vocab_tags = []
 		self.freqs = {}
 		self.freqs_as_probs = {}
 
+	@property
+	def nlp(self):
+		"""
+		The spaCy pipeline for this reader's profile, taken from the shared nlp_pool on first use unless one was
+		passed to the constructor
+		"""
+		return self._pipeline(self.profile)
+
+	def _pipeline(self, profile):
+		if self._nlp is not None:
+			return self._nlp
+		return get_profile(profile)
+
+	def set_profile(self, profile):
+		"""
+		Function to set the pipeline profile, i.e. which spaCy components run. Tilers using only tags, lemmas and
+		vectors should use 'tagger-only'; the parser is still run if sentence boundaries are needed
+
+		:param profile: name of a profile in nlp_pool.PROFILES: 'tagger-only', 'tagger+parser' or 'full'
+		:return: void
+		"""
+		if profile not in PROFILES:
+			raise ValueError("Unknown pipeline profile '" + str(profile) + "'. Expected one of: " + ", ".join(sorted(PROFILES)))
+		self.profile = profile
+
 	def set_vocab_tags(self, tag_list):
 		"""
 		Function to set POS tags considered in vocabulary bulding. Typically only lexical
@@ -21,42 +124,260 @@ class TileReader:
 		"""
 		self.vocab_tags = tag_list
 
-	def read(self, input_file, newline_tokenization=False, input_is_text=False):
+	def set_cache(self, cache):
+		"""
+		Function to set a persistent parse cache. Parses are looked up by text, tokenization mode and model
+		before running the NLP pipeline, and stored after parsing
+
+		:param cache: a parse_cache.ParseCache object, or None to disable caching
+		:return: void
+		"""
+		self.cache = cache
+
+	def read(self, input_file, newline_tokenization=False, input_is_text=False, n_process=1, min_chunk_size=20000):
 		"""
 		Reads a text file or string, runs NLP pipeline and collects vocabulary with frequencies
 
 		:param input_file: either a file name, or if input_is_text=True, the text to analyze
 		:param input_is_text: boolean, whether the input is a file name (default) or already a text string
+		:param n_process: number of worker processes; long texts are cut into chunks, at line breaks with
+			newline_tokenization and else at paragraph breaks (blank lines) of the input, and parsed in parallel.
+			Texts without paragraph breaks are parsed serially. Must be 1 for readers built with a custom pipeline,
+			see read_many
+		:param min_chunk_size: minimum number of characters per chunk when parsing in parallel
 		:return: void
 		"""
+		self._check_workers(n_process)
+		raw = self._load_text(input_file, input_is_text, collapse=False)
+		text = raw if input_is_text else self._collapse(raw)
+		profile = resolve_profile(self.profile, newline_tokenization)
+		nlp = self._pipeline(profile)
+		key, units, docs = self._lookup(text, newline_tokenization, nlp, profile)
+		if docs is None:
+			chunks = self._parallel_chunks(raw, text, newline_tokenization, input_is_text, n_process, min_chunk_size)
+			if len(chunks) > 1:
+				docs = self._parse_parallel(chunks, newline_tokenization, nlp, profile, n_process)
+			else:
+				docs = _parse_batch(nlp, [units])[0]
+			self._store(key, docs)
+		self._flush_cache()
+		self._collect(docs, newline_tokenization, self._model_id(nlp))
+
+	def _parallel_chunks(self, raw, text, newline_tokenization, input_is_text, n_process, min_chunk_size):
+		"""
+		Chunks of the text to parse in parallel, joining to the text. Without newline tokenization, cut points are
+		paragraph breaks of the raw input, found before read collapses blank lines, and each chunk is then collapsed
+		as read collapses the whole text.
+
+		:return: list of unicode chunks; a single chunk means the text is parsed serially
+		"""
+		if n_process < 2 or len(text) < 2 * min_chunk_size:
+			return [text]
+		if newline_tokenization:
+			return self._split_text(text, n_process, min_chunk_size, LINE_BREAK)
+		chunks = self._split_text(raw, n_process, min_chunk_size, PARAGRAPH_BREAK)
+		return chunks if input_is_text else [self._collapse(chunk) for chunk in chunks]
+
+	def _parse_parallel(self, chunks, newline_tokenization, nlp, profile, n_process):
+		"""
+		Parses the chunks of one long text in a process pool. With newline tokenization each line is parsed as its
+		own Doc, as in a serial parse, so the concatenated chunk parses are the serial result. Otherwise each chunk
+		is parsed as one Doc and the chunk Docs are joined into a Doc of the whole text with global token offsets.
+		Chunks end at paragraph breaks, but the tagger and parser see only their own chunk, so analyses near chunk
+		edges may still differ from a serial parse.
+
+		:return: list of parsed spaCy Docs in text order, one per sentence with newline_tokenization, else one
+		"""
+		jobs = [[self._units(chunk, newline_tokenization)] for chunk in chunks]
+		pool = Pool(min(n_process, len(jobs)), _init_worker, (profile,))
+		try:
+			parsed = pool.map(_parse_job, jobs)
+		finally:
+			pool.terminate()
+		from spacy.tokens import Doc
+		docs = [Doc(nlp.vocab).from_bytes(data) for job in parsed for doc_bytes in job for data in doc_bytes]
+		return docs if newline_tokenization else [_join_docs(nlp.vocab, docs)]
+
+	@staticmethod
+	def _split_text(text, n_chunks, min_chunk_size, breaks=LINE_BREAK):
+		"""
+		Cuts a text into at most n_chunks contiguous pieces of at least min_chunk_size characters, each ending just
+		after a match of breaks (except the last), so that joining the pieces gives back the text
+		"""
+		target = max(len(text) // n_chunks + 1, min_chunk_size)
+		chunks = []
+		start = 0
+		while start < len(text):
+			match = breaks.search(text, start + target)
+			if match is None or len(chunks) == n_chunks - 1:
+				end = len(text)
+			else:
+				end = match.end()
+			chunks.append(text[start:end])
+			start = end
+		return chunks
+
+	def read_many(self, inputs, newline_tokenization=False, input_is_text=False, n_process=1, batch_size=64):
+		"""
+		Generator function reading many files or strings, streaming them through the NLP pipeline in batches.
+		Readers are yielded in input order and share this reader's pipeline profile and vocabulary tags.
+
+		:param inputs: iterable of file names, or if input_is_text=True, of texts to analyze
+		:param newline_tokenization: boolean, whether each line is a sentence
+		:param input_is_text: boolean, whether the inputs are file names (default) or already text strings
+		:param n_process: number of worker processes to parse with; each worker loads the pipeline of this reader's
+			profile from nlp_pool, so a reader built with a custom pipeline must use n_process=1
+		:param batch_size: number of documents sent through the pipeline (or to a worker) at a time
+		:return: TileReader objects with sentences, vocab and freqs set, one per input
+		"""
+		self._check_workers(n_process)
+		texts = (self._load_text(item, input_is_text) for item in inputs)
+		profile = resolve_profile(self.profile, newline_tokenization)
+		nlp = self._pipeline(profile)
+		pool = Pool(n_process, _init_worker, (profile,)) if n_process > 1 else None
+		# batches handed to the pool but not yet yielded; a few are kept in flight to keep every worker busy
+		pending = deque()
+		try:
+			for batch in _batches(texts, batch_size):
+				entries = [self._lookup(text, newline_tokenization, nlp, profile) for text in batch]
+				misses = [units for key, units, docs in entries if docs is None]
+				if pool is None:
+					parsed = _parse_batch(nlp, misses)
+				else:
+					parsed = pool.apply_async(_parse_job, (misses,))
+				pending.append((entries, parsed))
+				while len(pending) > (2 * n_process if pool is not None else 0):
+					for reader in self._finish_batch(pending.popleft(), newline_tokenization, nlp, pool is not None):
+						yield reader
+			while pending:
+				for reader in self._finish_batch(pending.popleft(), newline_tokenization, nlp, pool is not None):
+					yield reader
+		finally:
+			if pool is not None:
+				pool.terminate()
+			self._flush_cache()
+
+	def _check_workers(self, n_process):
+		"""
+		Worker processes load their pipeline from nlp_pool by profile, which cannot reproduce a pipeline passed to
+		the constructor
+		"""
+		if n_process > 1 and self._nlp is not None:
+			raise ValueError("Parsing with worker processes needs a pipeline from nlp_pool; readers built with a "
+							 "custom pipeline must use n_process=1")
+
+	def _finish_batch(self, pending_batch, newline_tokenization, nlp, from_pool):
+		entries, parsed = pending_batch
+		if from_pool:
+			from spacy.tokens import Doc
+			parsed = [[Doc(nlp.vocab).from_bytes(data) for data in doc_bytes] for doc_bytes in parsed.get()]
+		parsed = iter(parsed)
+		model_id = self._model_id(nlp)
+		for key, units, docs in entries:
+			if docs is None:
+				docs = next(parsed)
+				self._store(key, docs)
+			yield self._new_reader(docs, newline_tokenization, model_id)
+
+	def _model_id(self, nlp, profile=None):
+		"""
+		String identifying the loaded model and, if given, the pipeline profile. With the profile it keys the parse
+		cache; without it, it tells apart the word vectors of documents built by different models.
+		"""
+		import spacy
+		meta = getattr(nlp, 'meta', None) or {}
+		if self._nlp is not None:
+			profile = 'custom'
+		model_id = "%s_%s-%s/spacy-%s" % (meta.get('lang', getattr(nlp, 'lang', 'en')), meta.get('name', 'default'),
+										  meta.get('version', ''), spacy.__version__)
+		return model_id if profile is None else model_id + "/" + profile
+
+	def _lookup(self, text, newline_tokenization, nlp, profile):
+		"""
+		:return: 3-place tuple of cache key (None without a cache), text units to parse and cached Docs or None
+		"""
+		units = self._units(text, newline_tokenization)
+		if self.cache is None:
+			return None, units, None
+		key = self.cache.make_key(text, newline_tokenization, self._model_id(nlp, profile))
+		return key, units, self.cache.get(key, nlp.vocab)
+
+	def _store(self, key, docs):
+		if self.cache is not None:
+			self.cache.put(key, docs)
+
+	def _flush_cache(self):
+		if self.cache is not None:
+			self.cache.flush()
+
+	@staticmethod
+	def _load_text(input_file, input_is_text=False, collapse=True):
+		"""
+		:param collapse: boolean, whether to collapse runs of line breaks in files, dropping empty lines
+		"""
 		if input_is_text:
 			text = input_file
 		else:
-			text = open(input_file).read()
-			text = re.sub(r'\n+', r'\n', text)
+			with open(input_file) as infile:
+				text = infile.read()
+			if collapse:
+				text = TileReader._collapse(text)
+		if not isinstance(text, unicode):
+			text = text.decode("utf8")
+		return text
+
+	@staticmethod
+	def _collapse(text):
+		return re.sub(r'\n+', r'\n', text)
 
+	@staticmethod
+	def _units(text, newline_tokenization):
+		"""
+		Splits a text into the units handed to the pipeline: one per line with newline_tokenization, else the whole text
+		"""
+		if newline_tokenization:
+			return [sentence for sentence in text.split("\n") if sentence]
+		return [text]
+
+	def _new_reader(self, docs, newline_tokenization, model_id=None):
+		reader = TileReader(nlp=self._nlp, profile=self.profile)
+		reader.set_vocab_tags(list(self.vocab_tags))
+		reader.set_cache(self.cache)
+		reader._collect(docs, newline_tokenization, model_id)
+		return reader
+
+	def _collect(self, docs, newline_tokenization, model_id=None):
+		"""
+		Sets sentences and document tokens from parsed Docs, then collects vocabulary with frequencies
+
+		:param docs: list of parsed spaCy Docs, one per sentence with newline_tokenization, else a single Doc
+		:param model_id: string identifying the model that parsed the Docs, see _model_id
+		:return: void
+		"""
+		self.document = None
+		self.model_id = model_id
 		if newline_tokenization:
-			sent_docs = [self.nlp(unicode(sentence)) for sentence in text.decode("utf8").split("\n") if sentence]
-			self.sentences = [[tok for tok in sent] for sent in sent_docs]
+			self.sentences = [[tok for tok in sent] for sent in docs]
 			self.doc = [tok for sent in self.sentences for tok in sent]
 		else:
-			self.doc = self.nlp(unicode(text.decode("utf8")))
+			self.doc = docs[0]
 			self.sentences = list(self.doc.sents)
 
-		self.vocab = set([])
+		vocab = set([])
 		freqs = defaultdict(int)
-		tok_count = 0.0
+		tok_count = 0
 		for token in self.doc:
 			if token.pos_ in self.vocab_tags:
-				self.vocab.add(token.lemma_)
+				vocab.add(token.lemma_)
 			freqs[token.lemma_] += 1
 			tok_count += 1
-		self.vocab = list(self.vocab)
+		self._set_counts(vocab, freqs, tok_count)
+
+	def _set_counts(self, vocab, freqs, tok_count):
+		self.vocab = list(vocab)
 		self.freqs = freqs
-		freqs_as_probs = {}
-		for item in freqs:
-			freqs_as_probs[item] = float(freqs[item])/len(self.doc)
-		self.freqs_as_probs = freqs_as_probs
+		total = float(tok_count)
+		self.freqs_as_probs = dict((item, count / total) for item, count in freqs.items())
 
 	def get_blocks(self, k, as_text=False):
 		"""
@@ -66,9 +387,7 @@ class TileReader:
 		:param as_text: Return each sentence as text if True, else as list of tokens
 		:return: ([A1,A2,..Ak],[B1,B2,..Bk]) - the tuple of two blocks listing sentences before and after split
 		"""
-		if 2*k > len(self.sentences):
-			raise IndexError("Window k="+str(k)+" too large for text.\n \
-			Expected > 2*" + str(k) +" sentences but only " + str(len(self.sentences)) + " found in text")
+		check_window(k, len(self.sentences))
 
 		for index, sent in enumerate(self.sentences[:len(self.sentences)-k]):
 			if index+k+k <= len(self.sentences):
@@ -78,6 +397,93 @@ class TileReader:
 					yield (list((sent) for sent in self.sentences[index:index + k]), list((sent) for sent in self.sentences[index + k:index+k*2]))
 
 
+	def stream(self, input_file, newline_tokenization=False, input_is_text=False, chunk_size=10000):
+		"""
+		Generator function yielding sentences lazily for inputs too long to hold in memory. The input is read and
+		parsed in paragraph-sized chunks, split at blank lines or, once chunk_size characters are collected, at the
+		next line break. Vocabulary and frequencies are updated as sentences are yielded; freqs_as_probs is set once
+		the input is exhausted. Neither the document nor the sentence list is kept.
+
+		:param input_file: either a file name, or if input_is_text=True, the text to analyze
+		:param newline_tokenization: boolean, whether each line is a sentence
+		:param input_is_text: boolean, whether the input is a file name (default) or already a text string
+		:param chunk_size: number of characters after which a chunk is closed at the next line break
+		:return: sentences as lists of tokens (newline_tokenization) or sentence spans
+		"""
+		nlp = self._pipeline(resolve_profile(self.profile, newline_tokenization))
+		self.doc = None
+		self.sentences = None
+		self.document = None
+		self.model_id = self._model_id(nlp)
+		vocab = set([])
+		freqs = defaultdict(int)
+		tok_count = 0
+		for chunk in self._chunks(input_file, input_is_text, chunk_size):
+			units = self._units(chunk, newline_tokenization)
+			docs = _parse_batch(nlp, [units])[0]
+			sentences = docs if newline_tokenization else docs[0].sents
+			for sent in sentences:
+				if newline_tokenization:
+					sent = [tok for tok in sent]
+				for token in sent:
+					if token.pos_ in self.vocab_tags:
+						vocab.add(token.lemma_)
+					freqs[token.lemma_] += 1
+					tok_count += 1
+				yield sent
+		self._set_counts(vocab, freqs, tok_count)
+
+	def stream_blocks(self, k, input_file, newline_tokenization=False, input_is_text=False, chunk_size=10000):
+		"""
+		Streaming counterpart of get_blocks: yields the same block tuples while holding only the 2*k sentences of
+		the current window in memory. Takes the input arguments of stream.
+
+		:param k: Half the window size, i.e. the number of sentences to return on either side of the split
+		:return: ([A1,A2,..Ak],[B1,B2,..Bk]) - the tuple of two blocks listing sentences before and after split
+		"""
+		window = deque(maxlen=2 * k)
+		sent_count = 0
+		for sent in self.stream(input_file, newline_tokenization, input_is_text, chunk_size):
+			window.append(sent)
+			sent_count += 1
+			if len(window) == 2 * k:
+				sents = list(window)
+				yield (sents[:k], sents[k:])
+		check_window(k, sent_count)
+
+	@staticmethod
+	def _chunks(input_file, input_is_text, chunk_size):
+		"""
+		Generator function returning the input as unicode chunks of whole lines, split at blank lines or after
+		chunk_size characters. Empty lines are dropped, as in read. A file is closed when the generator is
+		exhausted or closed.
+		"""
+		if input_is_text:
+			for chunk in TileReader._line_chunks(input_file.split("\n"), chunk_size):
+				yield chunk
+		else:
+			with open(input_file) as lines:
+				for chunk in TileReader._line_chunks(lines, chunk_size):
+					yield chunk
+
+	@staticmethod
+	def _line_chunks(lines, chunk_size):
+		chunk = []
+		size = 0
+		for line in lines:
+			if not isinstance(line, unicode):
+				line = line.decode("utf8")
+			line = line.rstrip("\r\n")
+			if line:
+				chunk.append(line)
+				size += len(line) + 1
+			if chunk and (not line or size >= chunk_size):
+				yield "\n".join(chunk)
+				chunk = []
+				size = 0
+		if chunk:
+			yield "\n".join(chunk)
+
 	def get_freqs(self, as_probability=False):
 		"""
 		Get a dictionary of lemma frequencies in the entire document.
@@ -91,6 +497,38 @@ class TileReader:
 		else:
 			return self.freqs
 
+	def build_document(self, with_vectors=True, release=False):
+		"""
+		Builds a compact integer-encoded Document from the parsed sentences, see document.Document
+
+		:param with_vectors: boolean, whether to store a vector per word form
+		:param release: boolean, whether to drop the spaCy document and sentences afterwards to free memory
+		:return: Document
+		"""
+		self.document = Document.from_sentences(self.sentences, with_vectors, model_id=self.model_id)
+		if release:
+			self.doc = None
+			self.sentences = None
+		return self.document
+
+	def get_block_stats(self, k=None, word_vectors=None):
+		"""
+		Block statistics for all gaps, computed from prefix sums instead of the sentence lists of get_blocks.
+		Uses the reader's vocabulary tags for new term counts and builds the Document if needed.
+
+		:param k: if given, return a dictionary of (left, right) arrays for this half window size; else the
+			document.BlockStats object, which answers for any k
+		:param word_vectors: optional matrix with one row per word form of the Document
+		:return: BlockStats, or dictionary with 'tokens', 'new_terms', 'embeddings' and 'lemmas' block aggregates
+		"""
+		if self.document is None:
+			self.build_document()
+		stats = self.document.block_stats(self.vocab_tags, word_vectors)
+		if k is None:
+			return stats
+		return {'tokens': stats.token_counts(k), 'new_terms': stats.new_term_counts(k),
+				'embeddings': stats.embedding_sums(k), 'lemmas': stats.lemma_counts(k)}
+
 
 def demo():
 	reader = TileReader()
@@ -2,46 +2,48 @@ import tile_reader as tr
 import os
 import scoring
 
+# only tags and lemmas are used; the reader adds the parser for sentence boundaries
+PIPELINE_PROFILE = 'tagger-only'
+
 options = {
     'w': 2,
     'vocab_tags': ["NOUN", "PROPN", "VERB", "ADJ"]
 }
 
 def tile(filename, options):
-    reader = tr.TileReader()
+    reader = tr.TileReader(profile=PIPELINE_PROFILE)
     reader.read(filename)
     reader.set_vocab_tags(options['vocab_tags'])
+    return tile_document(reader.build_document(with_vectors=False, release=True), options)
+
+
+def gap_scores(document, w, vocab_tags):
+    """
+    Vocabulary introduction scores of a document.Document: for each gap, the number of terms first seen in the 2*w
+    sentences around it divided by their number of tokens. Both come from the document's BlockStats, so the whole
+    curve takes O(tokens + gaps).
+
+    :param document: Document, e.g. from TileReader.build_document
+    :param w: half the window size, i.e. the number of sentences on either side of the gap
+    :param vocab_tags: POS tags of tokens counted as vocabulary terms
+    :return: numpy array with one score per gap
+    """
+    stats = document.block_stats(vocab_tags)
+    new_left, new_right = stats.new_term_counts(w)
+    tokens_left, tokens_right = stats.token_counts(w)
+    return (new_left + new_right) / (tokens_left + tokens_right).astype(float)
+
+
+def tile_document(document, options):
+    """
+    Vocabulary introduction tiling of a document.Document
+
+    :param document: Document, e.g. from TileReader.build_document
+    :param options: dictionary with 'w' and 'vocab_tags' as in the module options
+    :return: list of 1's and 0's marking sentences which begin a new tile
+    """
     w = options['w']
-    blocks = reader.get_blocks(w)
-
-    terms_seen = []
-    new_terms_by_sent = []
-    window_start = 0
-    scores = []
-
-    for blockA, blockB in blocks:
-
-        # make sure we have info on # new terms in each sentence in block
-        sent_index = window_start
-        for sent in blockA + blockB:
-            if len(new_terms_by_sent) <= sent_index:
-                new_terms = 0
-                for tok in sent:
-                    if tok.pos_ in reader.vocab_tags:
-                        lemma = tok.lemma
-                        if lemma not in terms_seen:
-                            new_terms += 1
-                            terms_seen.append(lemma)
-                new_terms_by_sent.append(new_terms)
-            sent_index += 1
-
-        # calculate block score
-        new_terms_in_window = sum(new_terms_by_sent[window_start:window_start+2*w])
-        total_words_in_window = sum([len(sent) for sent in blockA + blockB])
-        score = float(new_terms_in_window)/total_words_in_window
-        scores.append(score)
-
-        window_start += 1
+    scores = list(gap_scores(document, w, options['vocab_tags']))
 
     boundaries = scoring.find_boundaries(scores)
     output = [1] + (w-2)*[0]
@@ -52,29 +54,24 @@ def tile(filename, options):
             output.append(0)
     output += w*[0]
 
-    # for sentence in reader.sentences:
-    #     print sentence
-    print 'sentences in reader: ', len(reader.sentences)
+    print 'sentences in reader: ', document.n_sentences
     return output
 
 # testing code below adapted from james's code in word_vecs.py
-
-#for city in ['athens', 'chatham', 'coron', 'cuba', 'merida']:
-for city in ['chatham', 'coron', 'cuba']:
-    print city
-    segments = tile('data' + os.sep + 'GUM_voyage_'+city+'_noheads.txt', options)
-
-    golds = {}
-    with open(os.getcwd() + os.sep + 'data' + os.sep + 'boundaries_alternate') as infile:
-        for line in infile:
-            line = line.split()
-            golds[line[0]] = [int(x) for x in line[1:]]
-    print 'sentences in predicted: ', len(segments)
-    print 'sentences in gold:   ', len(golds[city])
-    print 'predicted:   ', segments
-    print 'gold:        ', golds[city]
-
-    print scoring.window_diff(segments, golds[city], 3)
-
-
-
+if __name__ == "__main__":
+    #for city in ['athens', 'chatham', 'coron', 'cuba', 'merida']:
+    for city in ['chatham', 'coron', 'cuba']:
+        print city
+        segments = tile('data' + os.sep + 'GUM_voyage_'+city+'_noheads.txt', options)
+
+        golds = {}
+        with open(os.getcwd() + os.sep + 'data' + os.sep + 'boundaries_alternate') as infile:
+            for line in infile:
+                line = line.split()
+                golds[line[0]] = [int(x) for x in line[1:]]
+        print 'sentences in predicted: ', len(segments)
+        print 'sentences in gold:   ', len(golds[city])
+        print 'predicted:   ', segments
+        print 'gold:        ', golds[city]
+
+        print scoring.window_diff(segments, golds[city], 3)
@@ -1 +1 @@
-from vectors import Vectors
\ No newline at end of file
+from vectors import Vectors, convert
@@ -1,13 +1,16 @@
 import numpy
 import cPickle
-from sklearn.neighbors import BallTree
-from scipy.spatial.distance import cosine
+
+# dtype of the matrix of the binary format
+BINARY_DTYPE = numpy.float32
 
 
 class Vectors:
     """
     This is a class for storing word vectors. It offers O(1) look up for the vector for a word and O(log n) nearest neighbour
     search when given a vector. It also provides cosine distance between two words.
+    Besides text and pickled .vecs files, vectors can be stored in a binary format (see convert) that load_binary
+    memory maps instead of parsing.
     """
     def __init__(self, filename=None, optimize=True):
         """
@@ -38,6 +41,8 @@ class Vectors:
         """
         This function optimizes the nearest neighbour search
         """
+        from sklearn.neighbors import BallTree
+        from scipy.spatial.distance import cosine
         if not self.ball_tree:
             print('Optimizing search...')
             self.ball_tree = BallTree(self.vectors, metric=cosine)
@@ -68,6 +73,31 @@ class Vectors:
         with open(filename, 'rb') as infile:
             self.word_index, self.vectors, self.words, self.ball_tree = cPickle.load(infile)
 
+    def save_binary(self, filename):
+        """
+        Saves the vectors in the binary format: a float32 matrix in <filename>.npy and the words, one per line in row
+        order, in <filename>.vocab. The ball tree is not saved; call optimize after loading if it is needed.
+        """
+        matrix_file, vocab_file = binary_files(filename)
+        numpy.save(matrix_file, numpy.asarray(self.vectors, dtype=BINARY_DTYPE))
+        _write_vocab(vocab_file, self.words)
+        print('saved as ' + matrix_file + ' and ' + vocab_file)
+
+    def load_binary(self, filename, mmap=True):
+        """
+        Loads vectors saved with save_binary or convert. By default the matrix is memory mapped read only, so loading
+        copies nothing, rows are paged in on first use and processes loading the same file share its pages.
+        """
+        matrix_file, vocab_file = binary_files(filename)
+        self.vectors = numpy.load(matrix_file, mmap_mode='r' if mmap else None)
+        with open(vocab_file, 'rb') as infile:
+            self.words = [line.rstrip('\n') for line in infile]
+        if len(self.words) != len(self.vectors):
+            raise ValueError(vocab_file + " has " + str(len(self.words)) + " words but " + matrix_file + " has " +
+                             str(len(self.vectors)) + " rows")
+        self.word_index = dict((word, index) for index, word in enumerate(self.words))
+        self.ball_tree = None
+
     def get(self, string, errors=True):
         """
         This function gets the vector for a string. if the string a a single word it returns that words vector otherwise,
@@ -93,7 +123,11 @@ class Vectors:
             a = self.ball_tree.query(numpy.array(vector).reshape(1, -1), k=k)
             dist, ind = a[0][0], a[1][0]
         else:
-            dists = [cosine(vector, vec) for vec in self.vectors]
+            if isinstance(self.vectors, numpy.ndarray):
+                dists = _cosine_distances(self.vectors, vector)
+            else:
+                from scipy.spatial.distance import cosine
+                dists = [cosine(vector, vec) for vec in self.vectors]
             ind = numpy.argsort(dists)[:k]
             dist = [dists[i] for i in ind]
             del dists
@@ -106,8 +140,97 @@ class Vectors:
         """
         This functon returns the cosine distance between the words in two strings, or between two vectors.
         """
+        from scipy.spatial.distance import cosine
         if isinstance(item1, str):
             item1 = self.get(item1, errors=errors)
         if isinstance(item2, str):
             item2 = self.get(item2, errors=errors)
         return cosine(item1, item2)
+
+
+def binary_files(filename):
+    """
+    :param filename: path of the binary format, with or without the .npy extension
+    :return: tuple(str, str)  # paths of the matrix and the vocabulary file
+    """
+    if filename.endswith('.npy'):
+        filename = filename[:-len('.npy')]
+    return filename + '.npy', filename + '.vocab'
+
+
+def _write_vocab(vocab_file, words):
+    with open(vocab_file, 'wb') as outfile:
+        for word in words:
+            outfile.write((word.encode('utf8') if isinstance(word, unicode) else word) + '\n')
+
+
+def _cosine_distances(matrix, vector, rows=65536):
+    """
+    cosine distance of vector to every row of matrix, computed in blocks of rows so that a memory mapped matrix is
+    streamed rather than copied whole
+    """
+    vector = numpy.asarray(vector, dtype=numpy.float64)
+    dists = numpy.empty(len(matrix))
+    for start in xrange(0, len(matrix), rows):
+        block = numpy.asarray(matrix[start:start + rows], dtype=numpy.float64)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            dists[start:start + rows] = 1.0 - block.dot(vector) / (numpy.sqrt((block * block).sum(axis=1)) *
+                                                                  numpy.sqrt(vector.dot(vector)))
+    return dists
+
+
+def convert(source, target, dimensions=None):
+    """
+    One-time conversion of a text vector file or a pickled .vecs file to the binary format read by
+    Vectors.load_binary. Text files are streamed in two passes, counting rows and then writing them straight into
+    the memory mapped .npy file, so the vectors are never held in Python lists.
+    :param source: text file of lines 'word x1 x2 ...', or a file saved with Vectors.save
+    :param target: path of the binary format, with or without the .npy extension
+    :param dimensions: int, vector size of text files; lines of other lengths are skipped, as a word2vec header is.
+        None takes the size of the first line with more than two fields
+    :return: tuple(int, int)  # words and dimensions written
+    """
+    matrix_file, vocab_file = binary_files(target)
+    if source.endswith('.vecs'):
+        vectors = Vectors()
+        vectors.load(source)
+        vectors.save_binary(target)
+        return len(vectors.words), len(vectors.vectors[0]) if len(vectors.vectors) else 0
+
+    n_words = 0
+    with open(source, 'rb') as infile:
+        for line in infile:
+            fields = line.split()
+            if dimensions is None and len(fields) > 2:
+                dimensions = len(fields) - 1
+            if len(fields) == (dimensions or 0) + 1:
+                n_words += 1
+    if not n_words:
+        raise ValueError("No vectors found in " + source)
+
+    matrix = numpy.lib.format.open_memmap(matrix_file, mode='w+', dtype=BINARY_DTYPE, shape=(n_words, dimensions))
+    words = []
+    with open(source, 'rb') as infile:
+        for line in infile:
+            fields = line.split()
+            if len(fields) == dimensions + 1:
+                matrix[len(words)] = numpy.array(fields[1:], dtype=BINARY_DTYPE)
+                words.append(fields[0])
+    matrix.flush()
+    del matrix
+    _write_vocab(vocab_file, words)
+    return n_words, dimensions
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Convert a text or .vecs vector file to the memory mapped binary format")
+    parser.add_argument("source", help="Text file of 'word x1 x2 ...' lines, or a file saved with Vectors.save")
+    parser.add_argument("target", help="Output path; <target>.npy and <target>.vocab are written")
+    parser.add_argument("-d", "--dimensions", type=int, default=None, help="Vector size of text files "
+                        "(default: that of the first vector line)")
+
+    options = parser.parse_args()
+    n_words, n_dimensions = convert(options.source, options.target, options.dimensions)
+    print("%d words of %d dimensions written to %s and %s" % ((n_words, n_dimensions) + binary_files(options.target)))
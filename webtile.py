@@ -6,7 +6,7 @@ print "Content-Type: text/html\n\n\n"
 
 from tile_vintro import tile as vintro
 from word_vecs import tile as vecs
-from lexical_chains import LexicalChains
+from lexical_chains import LexicalChains, PIPELINE_PROFILE as chains_profile
 from tile_reader import TileReader
 import cgi,re,platform
 
@@ -67,7 +67,7 @@ if "input_text" in form:
 		analysis, reader = vecs(input_text, vec_options, True)
 	elif method == "chains":
 		# Instantiate TileReader
-		reader = TileReader()
+		reader = TileReader(profile=chains_profile)
 		reader.read(input_text, True)
 		sents = reader.sentences
 
@@ -1,53 +1,166 @@
 import numpy
 import os
-from scipy.spatial.distance import cosine
 from vectors import Vectors
 
+from document import block_windows
 from scoring import find_boundaries, smoothing, depth_scoring, boundarize, window_diff
 from tile_reader import TileReader
 
+# sentences come from newline tokenization and only tags and vectors are used
+PIPELINE_PROFILE = 'tagger-only'
+
 options = {'vocab_tags': ["NOUN", "PROPN"],
            'block_length': 3,
            'smoothing_window': None,  # int or None
            'smoothing_type': 'liberal',  # liberal or conservative
            'out_type': 0,  # 0 or 1
-           'vectors': None} # None or a Vectors object (None defaults to Levy & Goldberg 2014)
+           'vectors': None,  # None or a Vectors object (None defaults to Levy & Goldberg 2014)
+           'pos_weighting': False,  # True to only embed tokens tagged with one of vocab_tags
+           'idf': None,  # None or a CorpusIndex to weight tokens by the IDF of their lemma
+           'cache': None}  # None or an EmbeddingCache to reuse embeddings of sentences seen before
 
 
-def _vectorize(block, vectors):
+def word_matrix(document, vectors=None, dtype=numpy.float32, word_ids=None):
     """
-    creates a vector representation of a block
-    :param block:
-    :return: numpy.array
+    one vector per word form of a document.Document, of any dimension, looked up in a single batched gather
+    :param document: Document
+    :param vectors: None to use the document's own word vectors, else a Vectors object; unknown words get zeros
+    :param dtype: numpy dtype of the matrix
+    :param word_ids: None for all word forms, else an array of the word form IDs to look up
+    :return: numpy.array of shape (word forms, dimensions)
     """
+    if word_ids is None:
+        word_ids = numpy.arange(len(document.words))
     if vectors is None:
-        vector = numpy.zeros(300)
-        for sentence in block:
-            for token in sentence:
-                vector += token.vector
-        return vector
-    else:
-        vector = numpy.zeros(300)
-        for sentence in block:
-            for token in sentence:
-                vector += numpy.array(vectors.get(str(token), False))
-        return vector
+        if document.vectors is None:
+            raise ValueError("Document has no word vectors; build it with with_vectors=True or pass a Vectors object")
+        return numpy.asarray(document.vectors[word_ids], dtype=dtype)
+    rows = numpy.array([vectors.word_index.get(document.words[word_id].encode('utf8'), -1) for word_id in word_ids],
+                       dtype=numpy.int64)
+    known = rows >= 0
+    dimensions = len(vectors.vectors[0]) if len(vectors.vectors) else 0
+    matrix = numpy.zeros((len(rows), dimensions), dtype=dtype)
+    if isinstance(vectors.vectors, numpy.ndarray):
+        matrix[known] = vectors.vectors[rows[known]]
+    elif known.any():
+        matrix[known] = numpy.array([vectors.vectors[row] for row in rows[known]], dtype=dtype)
+    return matrix
+
+
+def token_weights(document, vocab_tags=None, idf=None):
+    """
+    per-token weights for sentence embeddings
+    :param document: Document
+    :param vocab_tags: None, or POS tags of the tokens to keep; all other tokens get weight 0
+    :param idf: None, or a CorpusIndex whose IDF of each token's lemma is its weight
+    :return: numpy.array of float32 with one weight per token
+    """
+    weights = numpy.ones(len(document), dtype=numpy.float32)
+    if vocab_tags is not None:
+        weights *= document.mask(vocab_tags)
+    if idf is not None:
+        weights *= idf.idf(list(document.lemmas)).astype(numpy.float32)[document.lemma_ids]
+    return weights
+
+
+def sentence_embeddings(document, word_vectors, weights=None):
+    """
+    one (weighted) sum of token vectors per sentence, as a sparse sentence by word form matrix times the word
+    matrix, so that no per-token vectors are materialized
+    :param document: Document
+    :param word_vectors: matrix with one row per word form, e.g. from word_matrix
+    :param weights: None or per-token weights, e.g. from token_weights
+    :return: numpy.array of shape (sentences, dimensions) in the dtype of word_vectors
+    """
+    from scipy import sparse
+    if weights is None:
+        weights = numpy.ones(len(document), dtype=word_vectors.dtype)
+    counts = sparse.csr_matrix((weights.astype(word_vectors.dtype), (document.sentence_ids(), document.word_ids)),
+                               shape=(document.n_sentences, len(word_vectors)))
+    return numpy.asarray(counts.dot(word_vectors))
+
+
+def cached_sentence_embeddings(document, vectors, cache, vocab_tags=None):
+    """
+    sentence_embeddings through an EmbeddingCache: sentences whose normalized text was embedded before with the
+    same vector store are taken from the cache, and only the words of the remaining sentences are looked up.
+    Repeated sentences of the document are looked up and embedded once.
+    :param document: Document with sentence texts
+    :param vectors: None to use the document's own word vectors, else a Vectors object
+    :param cache: EmbeddingCache
+    :param vocab_tags: None, or POS tags of the tokens to keep, as in token_weights
+    :return: numpy.array of float32 of shape (sentences, dimensions)
+    """
+    from scipy import sparse
+    from embedding_cache import vector_store_id
+    if document.texts is None:
+        raise ValueError("Document has no sentence texts; build it with with_texts=True to use an embedding cache")
+    if not len(document.texts):
+        return numpy.zeros((0, 0), dtype=numpy.float32)
+    store_id = vector_store_id(vectors, document.model_id)
+    if vocab_tags is not None:
+        store_id += "|" + ",".join(sorted(vocab_tags))
+    keys = [cache.make_key(text, store_id) for text in document.texts]
+    # one entry per distinct key, represented by its first sentence
+    unique_keys, first_sentences, key_ids = numpy.unique(keys, return_index=True, return_inverse=True)
+    cached = [cache.get(key) for key in unique_keys]
+    missing = numpy.zeros(document.n_sentences, dtype=bool)
+    missing[first_sentences[numpy.array([vector is None for vector in cached], dtype=bool)]] = True
+
+    if missing.any():
+        tokens = missing[document.sentence_ids()]
+        needed, columns = numpy.unique(document.word_ids[tokens], return_inverse=True)
+        words = word_matrix(document, vectors, word_ids=needed)
+        weights = token_weights(document, vocab_tags)[tokens]
+        rows = numpy.cumsum(missing)[document.sentence_ids()[tokens]] - 1
+        counts = sparse.csr_matrix((weights, (rows, columns)), shape=(missing.sum(), len(needed)))
+        computed = numpy.asarray(counts.dot(words))
+        for row, sentence in enumerate(numpy.flatnonzero(missing)):
+            cached[key_ids[sentence]] = computed[row]
+            cache.put(keys[sentence], computed[row])
+        cache.flush()
+    return numpy.array(cached, dtype=numpy.float32)[key_ids]
+
+
+def gap_scores(sent_vectors, k):
+    """
+    cosine distance between the summed vectors of the k sentences before and after every gap. Block sums come
+    from cumulative sums over the sentences and all distances from one row-wise operation.
+    :param sent_vectors: numpy.array of shape (sentences, dimensions), e.g. from sentence_embeddings
+    :param k: block length in sentences
+    :return: numpy.array with one score per gap, nan where a block has no vector
+    """
+    prefix = numpy.zeros((len(sent_vectors) + 1, sent_vectors.shape[1]))
+    numpy.cumsum(sent_vectors, axis=0, dtype=numpy.float64, out=prefix[1:])
+    blocks_a, blocks_b = block_windows(prefix, k)
+    norms = numpy.sqrt((blocks_a * blocks_a).sum(axis=1) * (blocks_b * blocks_b).sum(axis=1))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return 1.0 - (blocks_a * blocks_b).sum(axis=1) / norms
 
 
 def tile(filename, options=options):
     filename = os.getcwd() + "\\" + filename
-    reader = TileReader()
+    reader = TileReader(profile=PIPELINE_PROFILE)
     reader.read(filename, newline_tokenization=True)
     reader.set_vocab_tags(options['vocab_tags'])
-    blocks = reader.get_blocks(options['block_length'])
+    return tile_document(reader.build_document(with_vectors=options['vectors'] is None, release=True), options)
 
-    # placeholder for similarity scores
-    similarity_scores = []
 
-    for blockA, blockB in blocks:
-        vecA = _vectorize(blockA, options['vectors'])
-        vecB = _vectorize(blockB, options['vectors'])
-        similarity_scores.append(cosine(vecA, vecB))
+def tile_document(document, options=options):
+    """
+    word vector tiling of a document.Document
+    :param document: Document, e.g. from TileReader.build_document
+    :param options: dictionary of options as in the module options
+    :return: list of 1's and 0's marking sentences which begin a new tile, or the tiled text if options['out_type'] is 1
+    """
+    k = options['block_length']
+    vocab_tags = options['vocab_tags'] if options.get('pos_weighting') else None
+    if options.get('cache') is not None and options.get('idf') is None:
+        sent_vectors = cached_sentence_embeddings(document, options['vectors'], options['cache'], vocab_tags)
+    else:
+        weights = token_weights(document, vocab_tags, options.get('idf'))
+        sent_vectors = sentence_embeddings(document, word_matrix(document, options['vectors']), weights)
+    similarity_scores = list(gap_scores(sent_vectors, k))
 
     if options['smoothing_window'] is None:
         bounds = boundarize(depth_scoring(similarity_scores), options['smoothing_type'])
@@ -57,15 +170,15 @@ def tile(filename, options=options):
     if options['out_type'] == 1:
         out_string = ''
         count = 0
-        for sent in reader.sentences:
+        for text in document.texts:
             if count in bounds:
                 out_string += "\n-----\n"
-            out_string += sent.text + '\n'
+            out_string += text + '\n'
             count += 1
         return out_string
     else:
         out_list = []
-        for i in xrange(len(reader.sentences)):
+        for i in xrange(document.n_sentences):
             if i-(options['block_length']) in bounds:
                 out_list.append(1)
             else:
@@ -73,19 +186,20 @@ def tile(filename, options=options):
         out_list[0] = 1
         return out_list
 
-city = 'chatham'
+if __name__ == "__main__":
+    city = 'chatham'
 
-#options['vectors'] = Vectors('vectors\GoogleNewsVecs.txt', False)
+    #options['vectors'] = Vectors('vectors\GoogleNewsVecs.txt', False)
 
-segments = tile('data\\GUM_voyage_'+city+'_noheads.txt', options)
-print segments
+    segments = tile('data\\GUM_voyage_'+city+'_noheads.txt', options)
+    print segments
 
-golds = {}
-with open(os.getcwd() + "\\data\\boundaries") as infile:
-    for line in infile:
-        line = line.split()
-        golds[line[0]] = [int(x) for x in line[1:]]
-print 'predicted:   ', segments, len(segments)
-print 'gold:        ', golds[city], len(golds[city])
+    golds = {}
+    with open(os.getcwd() + "\\data\\boundaries") as infile:
+        for line in infile:
+            line = line.split()
+            golds[line[0]] = [int(x) for x in line[1:]]
+    print 'predicted:   ', segments, len(segments)
+    print 'gold:        ', golds[city], len(golds[city])
 
-print window_diff(segments, golds[city], 3)
+    print window_diff(segments, golds[city], 3)